@@ -44,6 +44,8 @@ function App() {
 
   const [rubricEvaluation, setRubricEvaluation] = useState(null);
   const [showRubric, setShowRubric] = useState(false);
+  // saved compare result ({ id, prompt }) the rubric can evaluate in place
+  const [lastCompare, setLastCompare] = useState(null);
 
   const [darkMode, setDarkMode] = useState(() => {
     const saved = localStorage.getItem("darkMode");
@@ -64,6 +66,7 @@ function App() {
 
     setLoading(true);
     setResponses({});
+    setLastCompare(null);
 
     try {
       let endpoint =
@@ -93,7 +96,11 @@ function App() {
 
       if (compareMode === "groq") setResponses({ groq: data });
       else if (compareMode === "gemini") setResponses({ gemini: data });
-      else setResponses(data);
+      else {
+        const { history_id, ...results } = data;
+        setResponses(results);
+        if (history_id) setLastCompare({ id: history_id, prompt: body.prompt });
+      }
 
     } catch (err) {
       alert("Failed to get AI responses. Check server.");
@@ -102,11 +109,42 @@ function App() {
     }
   };
 
+  // API: rubric on the responses already shown, without asking the models again
+  const evaluateLastCompare = async () => {
+    setLoading(true);
+    setRubricEvaluation(null);
+    setShowRubric(false);
+
+    try {
+      const token = localStorage.getItem("token");
+      const response = await fetch(`${API_BASE_URL}/api/users/queries/${lastCompare.id}/evaluate`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Authorization: `Bearer ${token}` },
+        body: JSON.stringify({}),
+      });
+
+      const data = await response.json();
+      if (!response.ok) throw new Error("Failed to evaluate responses");
+
+      setRubricEvaluation(data.evaluation);
+      setShowRubric(true);
+    } catch (err) {
+      alert("Rubric comparison failed.");
+    } finally {
+      setLoading(false);
+    }
+  };
+
   // API: rubric comparison
   const handleCompareWithRubric = async (e) => {
     e.preventDefault();
     if (!prompt.trim()) return alert("Please enter a question");
 
+    const fullPrompt = systemPrompt ? `${systemPrompt}\n\n${prompt}` : prompt;
+    if (lastCompare && lastCompare.prompt === fullPrompt && localStorage.getItem("token")) {
+      return evaluateLastCompare();
+    }
+
     setLoading(true);
     setResponses({});
     setRubricEvaluation(null);
@@ -120,9 +158,7 @@ function App() {
       const response = await fetch(`${API_BASE_URL}/api/ai/compare-with-rubric`, {
         method: "POST",
         headers,
-        body: JSON.stringify({
-          prompt: systemPrompt ? `${systemPrompt}\n\n${prompt}` : prompt,
-        }),
+        body: JSON.stringify({ prompt: fullPrompt }),
       });
 
       const data = await response.json();
@@ -174,6 +210,7 @@ function App() {
     setResponses({});
     setRubricEvaluation(null);
     setShowRubric(false);
+    setLastCompare(null);
   };
 
   return (
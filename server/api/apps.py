@@ -1,7 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
 
+    def ready(self):
+        from config.database_config import configure_sqlite_connection
+        connection_created.connect(configure_sqlite_connection, dispatch_uid='configure_sqlite_connection')
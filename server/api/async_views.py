@@ -0,0 +1,283 @@
+"""
+Async versions of the AI views, used when the app is served over ASGI
+
+Provider calls use the async SDK clients and database work uses the async
+ORM, so a single worker process can hold many slow LLM requests open at once
+instead of tying up one thread per request.
+"""
+import json
+import logging
+from functools import partial, wraps
+from django.conf import settings
+from django.http import JsonResponse, HttpResponseNotAllowed
+from .auth import aget_authenticated_user
+from .history import asave_history
+from .ratelimit import acheck_rate_limit, rubric_budget
+from .deadline import request_deadline
+from .fanout import fan_out_async
+from .providers import get_response_async, selected_providers
+from .rubric import get_ai_comparison_rubric_async, rubric_mode, skipped_rubric, RUBRIC_PROVIDERS
+from .models import QueryHistory
+from .views import (
+    use_cache_for, set_cache_header, error_status, set_retry_after, compare_mode, history_responses,
+    stored_rubric_inputs, evaluation_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def async_api_view(methods):
+    """
+    csrf_exempt + require_http_methods for async views.
+
+    The Django 4.2 decorators wrap views in sync functions, which would hide
+    the coroutine from the handler.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def inner(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            return await func(request, *args, **kwargs)
+
+        inner.csrf_exempt = True
+        return inner
+
+    return decorator
+
+
+@async_api_view(["POST"])
+async def groq_view(request):
+    """Groq endpoint"""
+    try:
+        data = json.loads(request.body)
+        prompt = data.get('prompt')
+
+        if not prompt:
+            return JsonResponse({'error': 'Prompt is required'}, status=400)
+
+        user = await aget_authenticated_user(request)
+        limited = await acheck_rate_limit(request, user, 'compare')
+        if limited:
+            return limited
+
+        result = await get_response_async('groq', prompt, use_cache=use_cache_for(data), deadline=request_deadline(data))
+
+        # Save to history if user is authenticated
+        if user and not result.get('error'):
+            await asave_history(
+                user_id=user.id,
+                prompt=prompt,
+                responses={'groq': result.get('response')},
+                mode='groq'
+            )
+
+        status = error_status(result) if result.get('error') else 200
+        return set_retry_after(set_cache_header(JsonResponse(result, status=status), {'groq': result}), result)
+
+    except Exception as e:
+        return JsonResponse({
+            'error': 'Failed to get response from Groq',
+            'details': str(e)
+        }, status=500)
+
+
+@async_api_view(["POST"])
+async def gemini_view(request):
+    """Gemini endpoint"""
+    try:
+        data = json.loads(request.body)
+        prompt = data.get('prompt')
+
+        if not prompt:
+            return JsonResponse({'error': 'Prompt is required'}, status=400)
+
+        user = await aget_authenticated_user(request)
+        limited = await acheck_rate_limit(request, user, 'compare')
+        if limited:
+            return limited
+
+        result = await get_response_async('gemini', prompt, use_cache=use_cache_for(data), deadline=request_deadline(data))
+
+        # Save to history if user is authenticated
+        if user and not result.get('error'):
+            await asave_history(
+                user_id=user.id,
+                prompt=prompt,
+                responses={'gemini': result.get('response')},
+                mode='gemini'
+            )
+
+        status = error_status(result) if result.get('error') else 200
+        return set_retry_after(set_cache_header(JsonResponse(result, status=status), {'gemini': result}), result)
+
+    except Exception as e:
+        return JsonResponse({
+            'error': 'Failed to get response from Gemini',
+            'details': str(e)
+        }, status=500)
+
+
+@async_api_view(["POST"])
+async def compare_view(request):
+    """Compare endpoint - gets responses from the selected AIs (`providers`, default AI_DEFAULT_PROVIDERS)"""
+    try:
+        data = json.loads(request.body)
+        prompt = data.get('prompt')
+
+        if not prompt:
+            return JsonResponse({'error': 'Prompt is required'}, status=400)
+
+        try:
+            names = selected_providers(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        user = await aget_authenticated_user(request)
+        limited = await acheck_rate_limit(request, user, 'compare')
+        if limited:
+            return limited
+
+        use_cache = use_cache_for(data)
+        deadline = request_deadline(data)
+        results = await fan_out_async({
+            name: partial(get_response_async, name, prompt, use_cache, deadline) for name in names
+        }, deadline)
+
+        # Save to history if user is authenticated; the id lets the client
+        # evaluate these responses later (users/queries/<id>/evaluate)
+        history_id = None
+        if user and not any(result.get('error') for result in results.values()):
+            entry = await asave_history(
+                user_id=user.id,
+                prompt=prompt,
+                responses=history_responses(results),
+                mode=compare_mode(names),
+                write_behind=False,
+            )
+            history_id = entry.id
+
+        return set_cache_header(JsonResponse({**results, 'history_id': history_id}), results)
+
+    except Exception as e:
+        logger.exception('Compare error')
+        return JsonResponse({
+            'error': 'Failed to compare AI responses',
+            'details': str(e)
+        }, status=500)
+
+
+@async_api_view(["POST"])
+async def compare_with_rubric_view(request):
+    try:
+        data = json.loads(request.body)
+        prompt = data.get('prompt')
+
+        if not prompt:
+            return JsonResponse({'error': 'Prompt is required'}, status=400)
+
+        try:
+            mode = rubric_mode(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        user = await aget_authenticated_user(request)
+        limited = await acheck_rate_limit(request, user, rubric_budget(mode))
+        if limited:
+            return limited
+
+        use_cache = use_cache_for(data)
+        deadline = request_deadline(data)
+        provider_deadline = deadline.split(settings.AI_DEADLINE_BUDGETS['providers'])
+        results = await fan_out_async({
+            name: partial(get_response_async, name, prompt, use_cache, provider_deadline) for name in RUBRIC_PROVIDERS
+        }, provider_deadline)
+        groq_result = results['groq']
+        gemini_result = results['gemini']
+
+        if groq_result.get('error') and gemini_result.get('error'):
+            return set_retry_after(JsonResponse({
+                'error': 'Failed to get responses from both AI models',
+                'groq': groq_result,
+                'gemini': gemini_result
+            }, status=error_status(groq_result, gemini_result)), groq_result, gemini_result)
+
+        if groq_result.get('error') or gemini_result.get('error'):
+            # one model failed or ran out of time: return what we have
+            rubric_result = skipped_rubric()
+        else:
+            rubric_result = await get_ai_comparison_rubric_async(
+                prompt,
+                groq_result.get('response'),
+                gemini_result.get('response'),
+                deadline,
+                mode,
+            )
+
+        response_data = {
+            'prompt': prompt,
+            'responses': {
+                'groq': groq_result,
+                'gemini': gemini_result
+            },
+            'evaluation': rubric_result,
+            'partial': not rubric_result.get('success'),
+        }
+
+        if user and rubric_result.get('success'):
+            await asave_history(
+                user_id=user.id,
+                prompt=prompt,
+                responses=history_responses(results),
+                mode='compare_with_rubric'
+            )
+
+        return set_cache_header(JsonResponse(response_data), results)
+
+    except Exception as e:
+        logger.exception('Compare with rubric error')
+        return JsonResponse({
+            'error': 'Failed to compare AI responses with rubric',
+            'details': str(e)
+        }, status=500)
+
+
+@async_api_view(["POST"])
+async def evaluate_history_view(request, query_id):
+    """Async version of views.evaluate_history_view"""
+    try:
+        user = await aget_authenticated_user(request)
+        if not user:
+            return JsonResponse({
+                'error': 'Authentication required'
+            }, status=401)
+
+        data = json.loads(request.body or b'{}')
+        try:
+            mode = rubric_mode(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        q = await QueryHistory.objects.filter(id=query_id, user_id=user.id).with_responses().afirst()
+        if q is None:
+            return JsonResponse({'error': 'Query not found'}, status=404)
+
+        responses = stored_rubric_inputs(q)
+        if responses is None:
+            return JsonResponse({
+                'error': 'Query needs stored responses from both models to be evaluated'
+            }, status=400)
+
+        limited = await acheck_rate_limit(request, user, rubric_budget(mode))
+        if limited:
+            return limited
+
+        rubric_result = await get_ai_comparison_rubric_async(q.prompt, *responses, request_deadline(data), mode)
+        return evaluation_response(q, rubric_result)
+
+    except Exception as e:
+        logger.exception('Evaluate error')
+        return JsonResponse({
+            'error': 'Failed to evaluate query',
+            'details': str(e)
+        }, status=500)
@@ -0,0 +1,140 @@
+"""
+JWT authentication for the API views
+
+Access tokens carry the user's id, email, username and token version, so a
+verified token is enough to identify the caller. The User row is loaded only
+when a view needs fields that are not in the token (the profile endpoints).
+
+Revocation is checked against a small per-process TTL cache of
+(is_active, token_version) per user: deactivating a user or bumping their
+`token_version` invalidates outstanding tokens within AUTH_USER_CACHE_TTL
+seconds, and immediately in the process that made the change.
+"""
+import threading
+from cachetools import TTLCache
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .metrics import timing_span
+
+User = get_user_model()
+
+_user_states = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+_user_states_lock = threading.Lock()
+
+
+class AuthenticatedUser:
+    """The caller as described by a verified access token"""
+
+    def __init__(self, token):
+        self.id = token['user_id']
+        self.token_version = token.get('token_version', 0)
+        self._claims = token.payload
+        self._user = None
+
+    @property
+    def email(self):
+        # tokens issued before the claims were added only carry the id
+        if 'email' in self._claims:
+            return self._claims['email']
+        return self.get_user().email
+
+    @property
+    def username(self):
+        if 'username' in self._claims:
+            return self._claims['username']
+        return self.get_user().username
+
+    def get_user(self):
+        """The full User row, loaded on first use"""
+        if self._user is None:
+            with timing_span('auth'):
+                self._user = User.objects.get(id=self.id)
+        return self._user
+
+    async def aget_user(self):
+        """Async version of get_user"""
+        if self._user is None:
+            with timing_span('auth'):
+                self._user = await User.objects.aget(id=self.id)
+        return self._user
+
+
+def issue_tokens(user):
+    """Access and refresh tokens for `user`, with identity claims"""
+    refresh = RefreshToken.for_user(user)
+    # claims set on the refresh token are copied into its access tokens
+    refresh['email'] = user.email
+    refresh['username'] = user.username
+    refresh['token_version'] = user.token_version
+    return {
+        'access': str(refresh.access_token),
+        'refresh': str(refresh),
+    }
+
+
+def forget_user(user_id):
+    """Drop the cached state for a user after changing is_active or token_version"""
+    with _user_states_lock:
+        _user_states.pop(user_id, None)
+
+
+def _cached_state(user_id):
+    with _user_states_lock:
+        return _user_states.get(user_id)
+
+
+def _store_state(user_id, row):
+    # a missing user is cached too, so a deleted account cannot keep querying
+    state = row or (False, None)
+    with _user_states_lock:
+        _user_states[user_id] = state
+    return state
+
+
+def _is_current(state, auth_user):
+    is_active, token_version = state
+    return is_active and token_version == auth_user.token_version
+
+
+def _read_token(request):
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return AccessToken(auth_header.split(' ')[1])
+
+
+def get_authenticated_user(request):
+    """Helper function to get authenticated user from JWT token"""
+    try:
+        with timing_span('auth'):
+            token = _read_token(request)
+            if token is None:
+                return None
+
+            auth_user = AuthenticatedUser(token)
+            state = _cached_state(auth_user.id)
+            if state is None:
+                row = User.objects.filter(id=auth_user.id).values_list('is_active', 'token_version').first()
+                state = _store_state(auth_user.id, row)
+            return auth_user if _is_current(state, auth_user) else None
+    except Exception:
+        return None
+
+
+async def aget_authenticated_user(request):
+    """Async version of get_authenticated_user"""
+    try:
+        with timing_span('auth'):
+            token = _read_token(request)
+            if token is None:
+                return None
+
+            auth_user = AuthenticatedUser(token)
+            state = _cached_state(auth_user.id)
+            if state is None:
+                row = await User.objects.filter(id=auth_user.id).values_list('is_active', 'token_version').afirst()
+                state = _store_state(auth_user.id, row)
+            return auth_user if _is_current(state, auth_user) else None
+    except Exception:
+        return None
@@ -0,0 +1,200 @@
+"""
+Batch comparisons streamed back as NDJSON
+
+Every prompt goes through the same provider + rubric pipeline as
+compare_with_rubric_view. Each provider and the rubric judge get their own
+small thread pool for the batch, sized by AI_BATCH_CONCURRENCY, so a large
+batch can't take over the shared fan-out pool or exceed provider rate
+limits. Results are written one JSON object per line in completion order,
+and history is saved with a single bulk_create.
+
+In 'fast' rubric mode no judge pool is used: items that finished since the
+last line are scored together by fast_rubric_batch in one vectorized pass.
+"""
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from django.conf import settings
+from django.db import connections
+from .history import history_entry, save_history_batch
+from .metrics import timing_span
+from .providers import get_response
+from .rubric import get_ai_comparison_rubric, RUBRIC_PROVIDERS
+
+PROVIDER_CALLS = {name: partial(get_response, name) for name in RUBRIC_PROVIDERS}
+
+# evaluation placeholder for items waiting to be scored locally
+_FAST = object()
+
+
+def build_prompt(prompt, system_prompt=None):
+    """Same prompt layout the React client uses for system prompts"""
+    return f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+
+
+def parse_batch_items(data):
+    """
+    Turn the request body into a list of prompts.
+
+    `prompts` holds strings or {"prompt", "system_prompt"} objects, and a
+    top-level `system_prompt` applies to entries that don't set their own.
+    """
+    default_system_prompt = data.get('system_prompt')
+    items = []
+    for entry in data.get('prompts') or []:
+        if isinstance(entry, str):
+            entry = {'prompt': entry}
+        prompt = entry.get('prompt')
+        if not prompt:
+            raise ValueError('Every batch entry needs a prompt')
+        items.append(build_prompt(prompt, entry.get('system_prompt', default_system_prompt)))
+    return items
+
+
+class _BatchItem:
+    def __init__(self, index, prompt):
+        self.index = index
+        self.prompt = prompt
+        self.results = {}
+        self.lock = threading.Lock()
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def _future_result(future, name):
+    try:
+        return future.result()
+    except Exception as e:
+        return {'model': name, 'error': str(e), 'response': f'Failed to get response from {name}'}
+
+
+def _rubric_task(item, rubric_mode):
+    try:
+        return get_ai_comparison_rubric(
+            item.prompt,
+            item.results['groq'].get('response'),
+            item.results['gemini'].get('response'),
+            mode=rubric_mode,
+        )
+    finally:
+        # rubric threads live outside the request cycle, so close their connections here
+        connections.close_all()
+
+
+def _score_fast(ready):
+    """Fill in the local rubric of every ready item waiting for one, in one pass"""
+    waiting = [index for index, (_, evaluation) in enumerate(ready) if evaluation is _FAST]
+    if not waiting:
+        return
+    from .fast_rubric import fast_rubric_batch
+    with timing_span('rubric_fast'):
+        evaluations = fast_rubric_batch([
+            (item.prompt, item.results['groq'].get('response'), item.results['gemini'].get('response'))
+            for item, _ in (ready[index] for index in waiting)
+        ])
+    for index, evaluation in zip(waiting, evaluations):
+        ready[index] = (ready[index][0], evaluation)
+
+
+def compare_batch_stream(prompts, user=None, use_cache=True, with_rubric=True, rubric_mode='llm'):
+    """Yield one NDJSON line per prompt as it completes, then a summary line"""
+    limits = settings.AI_BATCH_CONCURRENCY
+    pools = {
+        name: ThreadPoolExecutor(max_workers=limits[name], thread_name_prefix=f'ai-batch-{name}')
+        for name in ('groq', 'gemini', 'rubric')
+    }
+    completed = queue.Queue()
+
+    def finish(item, evaluation=None):
+        completed.put((item, evaluation))
+
+    def on_rubric_done(item, future):
+        if future.cancelled():
+            return
+        try:
+            evaluation = future.result()
+        except Exception as e:
+            evaluation = {'success': False, 'error': 'Failed to generate comparison rubric', 'details': str(e)}
+        finish(item, evaluation)
+
+    def on_provider_done(item, name, future):
+        if future.cancelled():
+            return
+        with item.lock:
+            item.results[name] = _future_result(future, name)
+            if len(item.results) < len(PROVIDER_CALLS):
+                return
+
+        failed = any(result.get('error') for result in item.results.values())
+        if with_rubric and not failed and rubric_mode == 'fast':
+            finish(item, _FAST)
+        elif with_rubric and not failed:
+            try:
+                pools['rubric'].submit(_rubric_task, item, rubric_mode).add_done_callback(partial(on_rubric_done, item))
+            except RuntimeError:
+                # the batch was abandoned and the pools shut down
+                pass
+        else:
+            finish(item)
+
+    items = [_BatchItem(index, prompt) for index, prompt in enumerate(prompts)]
+    for item in items:
+        for name, call in PROVIDER_CALLS.items():
+            future = pools[name].submit(_timed, call, item.prompt, use_cache)
+            future.add_done_callback(partial(on_provider_done, item, name))
+
+    history = []
+    failures = 0
+    try:
+        remaining = len(items)
+        while remaining:
+            # take everything that finished meanwhile, so local scoring is batched
+            ready = [completed.get()]
+            while True:
+                try:
+                    ready.append(completed.get_nowait())
+                except queue.Empty:
+                    break
+            _score_fast(ready)
+
+            for item, evaluation in ready:
+                remaining -= 1
+                line = {
+                    'index': item.index,
+                    'prompt': item.prompt,
+                    'responses': item.results,
+                }
+                failed = any(result.get('error') for result in item.results.values())
+                if with_rubric:
+                    line['evaluation'] = evaluation
+                    failed = failed or not (evaluation and evaluation.get('success'))
+                if failed:
+                    failures += 1
+                elif user:
+                    history.append(history_entry(
+                        user_id=user.id,
+                        prompt=item.prompt,
+                        responses={name: result.get('response') for name, result in item.results.items()},
+                        mode='compare_with_rubric' if with_rubric else 'both'
+                    ))
+                yield json.dumps(line) + '\n'
+
+        yield json.dumps({'summary': {
+            'total': len(items),
+            'failed': failures,
+            'saved': len(history),
+        }}) + '\n'
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        # save what finished, even if the client went away mid-batch
+        if history:
+            save_history_batch(history)
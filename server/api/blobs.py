@@ -0,0 +1,37 @@
+"""
+Compressed, content-addressed storage for provider responses
+
+Each distinct response text is stored once in ResponseBlob, zlib-compressed
+and keyed by its sha256 digest. QueryHistory rows point at blobs, so a
+response repeated across cached or identical prompts costs one row. The
+digest is computed from the text alone, which lets a history row reference
+its blob before either is saved; `store_blobs` then inserts whichever blobs
+are new in a single query.
+"""
+import hashlib
+import zlib
+from django.conf import settings
+
+
+def response_digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress(text):
+    return zlib.compress(text.encode('utf-8'), settings.HISTORY_COMPRESSION_LEVEL)
+
+
+def decompress(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def store_blobs(texts):
+    """Insert blobs for `texts` ({digest: text}); ones that already exist are skipped"""
+    from .models import ResponseBlob
+
+    if not texts:
+        return
+    ResponseBlob.objects.bulk_create(
+        [ResponseBlob(digest=digest, data=compress(text), size=len(text)) for digest, text in texts.items()],
+        ignore_conflicts=True,
+    )
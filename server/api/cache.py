@@ -0,0 +1,148 @@
+"""
+Response cache for provider calls
+
+Two tiers: an in-process LRU with TTL, in front of an optional shared Django
+cache (AI_CACHE_ALIAS) so that all workers see the same entries.
+"""
+import copy
+import hashlib
+import json
+import threading
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import caches
+from .metrics import record_cache
+from .singleflight import flights, async_flights
+
+
+def make_request_key(provider, model, prompt, params=None):
+    """Hash of everything that determines a provider's answer"""
+    payload = json.dumps({
+        'provider': provider,
+        'model': model,
+        'version': settings.AI_CACHE_VERSION,
+        'prompt': prompt,
+        'params': params or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe two-tier cache of provider result dicts"""
+
+    key_prefix = 'ai-response:'
+
+    def __init__(self, max_size, ttl, alias=None):
+        self.ttl = ttl
+        self._local = TTLCache(maxsize=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self._shared = caches[alias] if alias else None
+
+    def get(self, key):
+        with self._lock:
+            value = self._local.get(key)
+
+        if value is None and self._shared is not None:
+            value = self._shared.get(self.key_prefix + key)
+            if value is not None:
+                with self._lock:
+                    self._local[key] = value
+
+        # callers annotate results, so never hand out the stored object
+        return copy.deepcopy(value)
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._local[key] = value
+        if self._shared is not None:
+            self._shared.set(self.key_prefix + key, value, timeout=self.ttl)
+
+    async def aget(self, key):
+        with self._lock:
+            value = self._local.get(key)
+
+        if value is None and self._shared is not None:
+            value = await self._shared.aget(self.key_prefix + key)
+            if value is not None:
+                with self._lock:
+                    self._local[key] = value
+
+        return copy.deepcopy(value)
+
+    async def aset(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._local[key] = value
+        if self._shared is not None:
+            await self._shared.aset(self.key_prefix + key, value, timeout=self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache(
+                    max_size=settings.AI_CACHE_MAX_ENTRIES,
+                    ttl=settings.AI_CACHE_TTL,
+                    alias=settings.AI_CACHE_ALIAS,
+                )
+    return _response_cache
+
+
+def cached_call(key, func, use_cache=True):
+    """
+    Return the cached result for `key`, or call `func` and cache its result.
+
+    With `use_cache=False` the cache is not read but a fresh successful result
+    still replaces the stored one. Error results are never cached. Concurrent
+    misses for the same key share a single call to `func`. The result gets a
+    `cached` flag telling whether it came from the cache.
+    """
+    cache = get_response_cache() if settings.AI_CACHE_ENABLED else None
+    if cache is not None and use_cache:
+        result = cache.get(key)
+        record_cache('response', hit=result is not None)
+        if result is not None:
+            result['cached'] = True
+            return result
+
+    def fetch():
+        result = func()
+        if cache is not None and not result.get('error'):
+            cache.set(key, result)
+        return result
+
+    result = flights.do(key, fetch)
+    result['cached'] = False
+    return result
+
+
+async def cached_call_async(key, func, use_cache=True):
+    """Async version of cached_call; `func` is a coroutine function"""
+    cache = get_response_cache() if settings.AI_CACHE_ENABLED else None
+    if cache is not None and use_cache:
+        result = await cache.aget(key)
+        record_cache('response', hit=result is not None)
+        if result is not None:
+            result['cached'] = True
+            return result
+
+    async def fetch():
+        result = await func()
+        if cache is not None and not result.get('error'):
+            await cache.aset(key, result)
+        return result
+
+    result = await async_flights.do(key, fetch)
+    result['cached'] = False
+    return result
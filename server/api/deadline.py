@@ -0,0 +1,220 @@
+"""
+Request deadlines and hedged provider calls
+
+A Deadline is the time budget of one request. Views split it across stages
+(provider calls, then the rubric judge), and every provider call gets the
+time left as its HTTP timeout, so a slow provider can no longer hold a
+request open indefinitely.
+
+Hedging trims the latency tail: when a provider call is still running after
+that provider's recent AI_HEDGE_PERCENTILE latency, a duplicate call is
+started and whichever answers first wins. Hedges are only sent once enough
+latencies have been seen to make the percentile meaningful.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.conf import settings
+from .metrics import hedged_requests
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """A point in time by which a request (or one of its stages) must finish"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def split(self, fraction):
+        """A sub-deadline for a stage that may use `fraction` of the time left"""
+        return Deadline(self.remaining() * fraction)
+
+
+def request_deadline(data):
+    """Deadline for a request; clients may ask for a shorter one with `deadline_ms`"""
+    seconds = settings.AI_REQUEST_DEADLINE
+    try:
+        requested = float(data.get('deadline_ms')) / 1000
+    except (TypeError, ValueError):
+        requested = None
+    if requested and requested > 0:
+        seconds = min(seconds, requested)
+    return Deadline(seconds)
+
+
+def timed_out_result(model):
+    """Result dict for a call to `model` that did not finish within its deadline"""
+    return {
+        'model': model,
+        'error': 'Deadline exceeded',
+        'response': 'No response within the deadline',
+        'timed_out': True,
+    }
+
+
+def timeout_for(deadline):
+    """HTTP timeout for a call made under `deadline` (None means no limit)"""
+    if deadline is None:
+        return None
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded')
+    return remaining
+
+
+class LatencyTracker:
+    """Recent successful call latencies of one provider"""
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, fraction):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(name):
+    tracker = _trackers.get(name)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(name, LatencyTracker(settings.AI_HEDGE_WINDOW))
+    return tracker
+
+
+def hedge_delay(name, deadline):
+    """Seconds to wait before hedging a call, or None to not hedge it"""
+    if not settings.AI_HEDGE_ENABLED:
+        return None
+    delay = get_tracker(name).percentile(settings.AI_HEDGE_PERCENTILE)
+    if delay is None:
+        return None
+    delay = max(delay, settings.AI_HEDGE_MIN_DELAY)
+    # a hedge that cannot finish before the deadline only adds load
+    if deadline is not None and delay >= deadline.remaining() / 2:
+        return None
+    return delay
+
+
+def get_hedge_executor():
+    """
+    Thread pool for hedged attempts.
+
+    Separate from the fan-out pool, whose threads block waiting on these
+    attempts; sharing one pool could deadlock once it is saturated.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.AI_MAX_WORKERS * 2,
+                    thread_name_prefix='ai-hedge',
+                )
+    return _executor
+
+
+def _attempt(name, func, deadline):
+    start = time.monotonic()
+    result = func(timeout_for(deadline))
+    get_tracker(name).record(time.monotonic() - start)
+    return result
+
+
+def hedged_call(name, func, deadline=None):
+    """
+    Call `func(timeout)`, hedging it with a duplicate call if it runs long.
+
+    The first attempt to succeed wins; if both fail the first error is
+    raised. The losing attempt is left to run out its own timeout.
+    """
+    delay = hedge_delay(name, deadline)
+    if delay is None:
+        return _attempt(name, func, deadline)
+
+    executor = get_hedge_executor()
+    primary = executor.submit(contextvars.copy_context().run, _attempt, name, func, deadline)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    hedge = executor.submit(contextvars.copy_context().run, _attempt, name, func, deadline)
+    attempts = {primary: 'primary', hedge: 'hedge'}
+    pending = set(attempts)
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=timeout_for(deadline), return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded('Deadline exceeded')
+        for future in done:
+            if future.exception() is None:
+                hedged_requests.inc(provider=name, winner=attempts[future])
+                return future.result()
+            error = error or future.exception()
+    hedged_requests.inc(provider=name, winner='none')
+    raise error
+
+
+async def _attempt_async(name, func, deadline):
+    start = time.monotonic()
+    result = await func(timeout_for(deadline))
+    get_tracker(name).record(time.monotonic() - start)
+    return result
+
+
+async def hedged_call_async(name, func, deadline=None):
+    """Async version of hedged_call; the losing attempt is cancelled"""
+    delay = hedge_delay(name, deadline)
+    if delay is None:
+        return await _attempt_async(name, func, deadline)
+
+    primary = asyncio.ensure_future(_attempt_async(name, func, deadline))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    hedge = asyncio.ensure_future(_attempt_async(name, func, deadline))
+    attempts = {primary: 'primary', hedge: 'hedge'}
+    pending = set(attempts)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=timeout_for(deadline), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded('Deadline exceeded')
+            for task in done:
+                if task.exception() is None:
+                    hedged_requests.inc(provider=name, winner=attempts[task])
+                    return task.result()
+                error = error or task.exception()
+        hedged_requests.inc(provider=name, winner='none')
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
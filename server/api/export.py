@@ -0,0 +1,137 @@
+"""
+Streaming export of query history
+
+Rows are read HISTORY_EXPORT_CHUNK_SIZE at a time (with their responses
+prefetched per chunk), written out as NDJSON or CSV and sent in ~64 KB
+pieces, optionally gzipped on the fly, so memory stays flat however long
+the history is.
+
+- NDJSON: one object per history entry, shaped like /users/queries;
+- CSV: one line per stored response (id, created_at, mode, prompt,
+  provider, model, response), so any number of providers fits one header.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.text import compress_sequence
+from .pagination import keyset_page
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+CSV_COLUMNS = ['id', 'created_at', 'mode', 'prompt', 'provider', 'model', 'response']
+BUFFER_SIZE = 64 * 1024
+
+
+def parse_timestamp(value, name, end=False):
+    """
+    Aware datetime from an ISO date or datetime query parameter. A bare date
+    as the `end` of a range includes that whole day.
+    """
+    try:
+        # dates first: parse_datetime also accepts a bare date, as midnight
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO date or datetime')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _pages(queryset, chunk_size):
+    if connections[queryset.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        # without a server-side cursor psycopg2 would load the whole result,
+        # so walk the history in keyset pages instead
+        cursor = None
+        while True:
+            rows, cursor = keyset_page(queryset, chunk_size, cursor)
+            yield from rows
+            if cursor is None:
+                return
+    else:
+        yield from queryset.order_by('-created_at', '-id').iterator(chunk_size=chunk_size)
+
+
+def history_rows(queryset, chunk_size):
+    """Every row of `queryset`, newest first, fetched `chunk_size` at a time"""
+    for row in _pages(queryset, chunk_size):
+        yield row
+        # prefetched responses point back at their row; dropping them once the
+        # row is written frees it now rather than at the next cyclic GC
+        row._prefetched_objects_cache.clear()
+
+
+def ndjson_lines(rows, serialize):
+    for row in rows:
+        yield json.dumps(serialize(row)) + '\n'
+
+
+class _Line:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        created_at = row.created_at.isoformat()
+        for response in row.responses.all():
+            yield writer.writerow([
+                row.id, created_at, row.mode, row.prompt, response.provider, response.model, response.text,
+            ])
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Join lines into byte chunks of about `size` bytes"""
+    parts, length = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b''.join(parts)
+
+
+def export_stream(rows, export_format, serialize, compress=False):
+    """Byte chunks of the export of `rows`"""
+    lines = csv_lines(rows) if export_format == 'csv' else ndjson_lines(rows, serialize)
+    chunks = buffered(lines)
+    return compress_sequence(chunks) if compress else chunks
+
+
+async def async_chunks(chunks):
+    """
+    Serve a sync chunk iterator under ASGI one chunk at a time; Django 4.2
+    would otherwise read a sync iterator to the end before sending anything.
+    """
+    # thread_sensitive keeps every step on the thread that owns the DB connection
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await step(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        # a stream abandoned part way releases what it holds (provider calls, cursors)
+        close = getattr(chunks, 'close', None)
+        if close:
+            await sync_to_async(close, thread_sensitive=True)()
@@ -0,0 +1,99 @@
+"""
+Fan-out helpers for running provider calls in parallel
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from .deadline import timed_out_result
+from .providers import provider_label
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# extra wait past a deadline before fan_out gives up on a call
+DEADLINE_GRACE = 1.0
+
+
+def get_executor():
+    """Shared bounded thread pool used for all provider calls in this process"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.AI_MAX_WORKERS,
+                    thread_name_prefix='ai-fanout',
+                )
+    return _executor
+
+
+def _timed_call(func):
+    start = time.perf_counter()
+    result = func()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return result, elapsed_ms
+
+
+def _wait_time(deadline):
+    # calls get the deadline as their own timeout and report it themselves;
+    # this only catches calls that overran it anyway
+    return deadline.remaining() + DEADLINE_GRACE if deadline else None
+
+
+def fan_out(calls, deadline=None):
+    """
+    Run every call at once and wait for all of them.
+
+    `calls` maps a provider name to a zero-argument callable returning a result dict.
+    Each result dict gets a `latency_ms` entry with the time spent on that call,
+    so the total wall time is that of the slowest call instead of the sum.
+    Calls still running after `deadline` get a `timed_out` result.
+    """
+    start = time.perf_counter()
+    executor = get_executor()
+    # run each call in a copy of the caller's context so request-scoped
+    # state (e.g. timing spans) follows it into the pool thread
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, _timed_call, func)
+        for name, func in calls.items()
+    }
+
+    results = {}
+    for name, future in futures.items():
+        try:
+            result, elapsed_ms = future.result(timeout=_wait_time(deadline))
+        except FutureTimeoutError:
+            result, elapsed_ms = timed_out_result(provider_label(name)), (time.perf_counter() - start) * 1000
+        result['latency_ms'] = round(elapsed_ms, 1)
+        results[name] = result
+    return results
+
+
+async def _timed_call_async(func):
+    start = time.perf_counter()
+    result = await func()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return result, elapsed_ms
+
+
+async def _timed_call_within(name, func, deadline):
+    start = time.perf_counter()
+    try:
+        return await asyncio.wait_for(_timed_call_async(func), _wait_time(deadline))
+    except asyncio.TimeoutError:
+        return timed_out_result(provider_label(name)), (time.perf_counter() - start) * 1000
+
+
+async def fan_out_async(calls, deadline=None):
+    """Async version of fan_out; `calls` maps a name to a coroutine function"""
+    names = list(calls)
+    outcomes = await asyncio.gather(*(_timed_call_within(name, calls[name], deadline) for name in names))
+
+    results = {}
+    for name, (result, elapsed_ms) in zip(names, outcomes):
+        result['latency_ms'] = round(elapsed_ms, 1)
+        results[name] = result
+    return results
@@ -0,0 +1,276 @@
+"""
+Local heuristic rubric, computed in milliseconds without an LLM
+
+Scores both responses from text statistics: length and structure (lists,
+headings, code blocks), coverage of the prompt's key terms, ROUGE-1/2
+overlap between the two responses, Flesch reading ease and how much a
+response repeats itself. The numbers are approximate and only meant to rank
+clearly different answers; results are marked `"approximate": true`.
+
+All pairs of a batch are scored in one pass: tokens are hashed into
+HASH_BUCKETS columns and each text's terms are counted with np.unique over
+(row, column) keys. The count matrix is kept sparse, as sorted keys with
+their counts, so memory grows with the batch's tokens rather than with
+HASH_BUCKETS per text, and the overlap and ratio metrics are array
+operations over those keys.
+"""
+import re
+import zlib
+import numpy as np
+from django.conf import settings
+
+EVALUATOR = 'Local heuristics'
+HASH_BUCKETS = 4096
+# word count at which a response counts as complete
+TARGET_WORDS = 350
+
+TOKEN = re.compile(r"[a-z0-9']+")
+SENTENCE_END = re.compile(r'[.!?]+(?:\s|$)')
+SYLLABLE = re.compile(r'[aeiouy]+')
+LIST_ITEM = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+', re.MULTILINE)
+HEADING = re.compile(r'^\s*(?:#{1,6}\s+\S|\*\*[^*\n]+\*\*\s*:?\s*$)', re.MULTILINE)
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just me more most my no nor not now of off on once only or other our out over own
+same she should so some such than that the their them then there these they this those through to too under until
+up very was we were what when where which while who whom why will with would you your explain describe tell give
+please write
+""".split())
+
+
+def _tokens(text):
+    return TOKEN.findall((text or '').lower())
+
+
+def _hashes(tokens):
+    return np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.int64, count=len(tokens))
+
+
+def _sparse_counts(rows, columns):
+    """
+    Sparse term counts from parallel row/column index arrays: the sorted
+    distinct keys row * HASH_BUCKETS + column, and the count of each.
+    """
+    return np.unique(rows * HASH_BUCKETS + columns, return_counts=True)
+
+
+def _row_totals(counts, n_rows):
+    """Sum of each row's counts"""
+    keys, values = counts
+    return np.bincount(keys // HASH_BUCKETS, weights=values, minlength=n_rows)
+
+
+def _row_sizes(counts, n_rows):
+    """Number of distinct terms in each row"""
+    return np.bincount(counts[0] // HASH_BUCKETS, minlength=n_rows)
+
+
+def _ngram_counts(hashed, n):
+    """Sparse counts of hashed n-grams for a list of per-text hash arrays"""
+    rows, columns = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for row, values in enumerate(hashed):
+        if len(values) < n:
+            continue
+        combined = values[:len(values) - n + 1].copy()
+        for offset in range(1, n):
+            combined = combined * 1000003 + values[offset:len(values) - n + 1 + offset]
+        rows.append(np.full(len(combined), row, dtype=np.int64))
+        columns.append(combined % HASH_BUCKETS)
+    return _sparse_counts(np.concatenate(rows), np.concatenate(columns))
+
+
+def _f1(counts, n):
+    """ROUGE-style F1 between rows i and n + i of sparse counts over 2n rows"""
+    keys, values = counts
+    split = np.searchsorted(keys, n * HASH_BUCKETS)
+    a_keys, a_values = keys[:split], values[:split]
+    b_keys, b_values = keys[split:] - n * HASH_BUCKETS, values[split:]
+    common, a_index, b_index = np.intersect1d(a_keys, b_keys, assume_unique=True, return_indices=True)
+    overlap = np.bincount(
+        common // HASH_BUCKETS, weights=np.minimum(a_values[a_index], b_values[b_index]), minlength=n,
+    )
+    a_total = _row_totals((a_keys, a_values), n)
+    b_total = _row_totals((b_keys, b_values), n)
+    precision = np.divide(overlap, b_total, out=np.zeros(len(overlap)), where=b_total > 0)
+    recall = np.divide(overlap, a_total, out=np.zeros(len(overlap)), where=a_total > 0)
+    total = precision + recall
+    return np.divide(2 * precision * recall, total, out=np.zeros(len(overlap)), where=total > 0)
+
+
+def text_metrics(prompts, texts):
+    """
+    Per-text metric arrays for `texts`, where texts[i] answers prompts[i],
+    plus the texts' sparse unigram and bigram counts.
+    """
+    tokens = [_tokens(text) for text in texts]
+    hashed = [_hashes(words) for words in tokens]
+    n = len(texts)
+
+    words = np.array([len(words) for words in tokens], dtype=float)
+    sentences = np.array([max(1, len(SENTENCE_END.findall(text or ''))) for text in texts], dtype=float)
+    syllables = np.array([len(SYLLABLE.findall((text or '').lower())) for text in texts], dtype=float)
+    structure = np.array([
+        len(LIST_ITEM.findall(text or '')) + len(HEADING.findall(text or '')) for text in texts
+    ], dtype=float)
+    code_blocks = np.array([(text or '').count('```') // 2 for text in texts], dtype=float)
+
+    safe_words = np.maximum(words, 1)
+    reading_ease = 206.835 - 1.015 * (words / sentences) - 84.6 * (syllables / safe_words)
+
+    # share of the prompt's content words that the response uses
+    prompt_terms = _ngram_counts([
+        _hashes([word for word in _tokens(prompt) if word not in STOPWORDS and len(word) > 2])
+        for prompt in prompts
+    ], 1)
+    unigrams = _ngram_counts(hashed, 1)
+    prompt_size = _row_sizes(prompt_terms, n)
+    covered = np.bincount(
+        prompt_terms[0][np.isin(prompt_terms[0], unigrams[0], assume_unique=True)] // HASH_BUCKETS, minlength=n,
+    )
+    coverage = np.divide(covered, prompt_size, out=np.full(n, np.nan), where=prompt_size > 0)
+
+    # repeated trigrams: 0 for no repetition, towards 1 for a loop
+    trigrams = _ngram_counts(hashed, 3)
+    trigram_total = _row_totals(trigrams, n)
+    duplication = np.divide(
+        trigram_total - _row_sizes(trigrams, n), trigram_total,
+        out=np.zeros(n), where=trigram_total > 0,
+    )
+
+    return {
+        'words': words,
+        'sentences': sentences,
+        'structure': structure,
+        'code_blocks': code_blocks,
+        'reading_ease': reading_ease,
+        'prompt_coverage': coverage,
+        'duplication': duplication,
+        'unigrams': unigrams,
+        'bigrams': _ngram_counts(hashed, 2),
+    }
+
+
+def _criteria(metrics, agreement):
+    """1-10 scores per criterion, as arrays over texts"""
+    coverage = np.nan_to_num(metrics['prompt_coverage'], nan=0.7)
+    length = np.clip(np.log1p(metrics['words']) / np.log1p(TARGET_WORDS), 0, 1)
+    organised = np.minimum(1, (metrics['structure'] + metrics['code_blocks']) / 4)
+    readable = np.clip((metrics['reading_ease'] - 10) / 60, 0, 1)
+    duplication = metrics['duplication']
+
+    scores = {
+        'accuracy': 6 + 2 * agreement - 4 * duplication,
+        'relevance': 1 + 9 * np.sqrt(coverage),
+        'clarity': 3 + 5 * readable + organised - 3 * duplication,
+        'completeness': 1 + 9 * length,
+        'usefulness': 1 + 4 * length + 2 * organised + 3 * coverage - 2 * duplication,
+    }
+    return {name: np.clip(np.rint(values), 1, 10).astype(int) for name, values in scores.items()}
+
+
+def _notes(metrics, index):
+    strengths, weaknesses = [], []
+    coverage = metrics['prompt_coverage'][index]
+    if not np.isnan(coverage):
+        if coverage >= 0.6:
+            strengths.append("Addresses most of the prompt's key terms")
+        elif coverage < 0.3:
+            weaknesses.append("Misses many of the prompt's key terms")
+    if metrics['structure'][index] >= 3:
+        strengths.append('Well structured with lists or headings')
+    if metrics['code_blocks'][index]:
+        strengths.append('Includes code examples')
+    # readability formulas mean little for a few words
+    if metrics['words'][index] >= 20 and metrics['reading_ease'][index] >= 60:
+        strengths.append('Easy to read')
+    elif metrics['words'][index] >= 20 and metrics['reading_ease'][index] < 30:
+        weaknesses.append('Long, dense sentences')
+    if metrics['words'][index] < 50:
+        weaknesses.append('Very short')
+    if metrics['duplication'][index] >= 0.2:
+        weaknesses.append('Repeats itself')
+    return strengths, weaknesses
+
+
+def _summary(metrics, index):
+    return {
+        'words': int(metrics['words'][index]),
+        'sentences': int(metrics['sentences'][index]),
+        'structure_items': int(metrics['structure'][index]),
+        'code_blocks': int(metrics['code_blocks'][index]),
+        'reading_ease': round(float(metrics['reading_ease'][index]), 1),
+        'prompt_coverage': None if np.isnan(metrics['prompt_coverage'][index])
+        else round(float(metrics['prompt_coverage'][index]), 3),
+        'duplication': round(float(metrics['duplication'][index]), 3),
+    }
+
+
+def fast_rubric_batch(pairs):
+    """
+    Approximate rubric results for many (prompt, response_a, response_b)
+    triples, scored together in one vectorized pass.
+    """
+    if not pairs:
+        return []
+    n = len(pairs)
+    prompts = [prompt for prompt, _, _ in pairs]
+    texts = [a for _, a, _ in pairs] + [b for _, _, b in pairs]
+    metrics = text_metrics(prompts + prompts, texts)
+
+    # rows 0..n-1 are response A, n..2n-1 response B
+    rouge1 = _f1(metrics['unigrams'], n)
+    rouge2 = _f1(metrics['bigrams'], n)
+    scores = _criteria(metrics, np.concatenate([rouge1, rouge1]))
+    totals = sum(scores.values())
+
+    results = []
+    for index in range(n):
+        sections = {}
+        for key, row in (('response_a', index), ('response_b', n + index)):
+            strengths, weaknesses = _notes(metrics, row)
+            sections[key] = {name: int(values[row]) for name, values in scores.items()}
+            sections[key]['total'] = int(totals[row])
+            sections[key]['strengths'] = strengths
+            sections[key]['weaknesses'] = weaknesses
+
+        total_a, total_b = int(totals[index]), int(totals[n + index])
+        if total_a == total_b:
+            recommendation = 'Either response; the heuristics cannot separate them.'
+        else:
+            better = 'A' if total_a > total_b else 'B'
+            recommendation = f'Response {better}, by {abs(total_a - total_b)} points on the heuristic scores.'
+
+        results.append({
+            'success': True,
+            'rubric': {
+                **sections,
+                'overall_comparison': (
+                    f'Heuristic scores: A {total_a}/50, B {total_b}/50. '
+                    f'The responses share {rouge1[index]:.0%} of their words (ROUGE-1 F1).'
+                ),
+                'recommendation': recommendation,
+            },
+            'evaluator': EVALUATOR,
+            'approximate': True,
+            'metrics': {
+                'response_a': _summary(metrics, index),
+                'response_b': _summary(metrics, n + index),
+                'rouge_1': round(float(rouge1[index]), 3),
+                'rouge_2': round(float(rouge2[index]), 3),
+            },
+        })
+    return results
+
+
+def fast_rubric(prompt, response_a, response_b):
+    """Approximate rubric for one pair of responses"""
+    return fast_rubric_batch([(prompt, response_a, response_b)])[0]
+
+
+def is_decisive(result):
+    """Whether one response wins by enough that the LLM judge would not change the outcome"""
+    rubric = result['rubric']
+    margin = abs(rubric['response_a']['total'] - rubric['response_b']['total'])
+    return margin >= settings.AI_FAST_RUBRIC_MARGIN
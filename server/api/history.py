@@ -0,0 +1,190 @@
+"""
+Query history writes
+
+With HISTORY_WRITE_BEHIND on (the default), `save_history` hands the row to
+a background thread and returns at once, so the response no longer waits on
+an INSERT. The thread buffers rows and writes them with one bulk_create when
+HISTORY_FLUSH_SIZE rows are pending or HISTORY_FLUSH_INTERVAL seconds have
+passed since the first one, turning a burst of single-row transactions into
+a few batched ones (and far less contention for SQLite's writer lock).
+Pending rows are flushed at interpreter exit.
+
+Set HISTORY_WRITE_BEHIND=false for synchronous inserts, e.g. in tests that
+read history right after a request. Queued rows get their id and created_at
+when they are flushed, so callers that return the id (compare, which the
+evaluate endpoint refers back to) insert synchronously.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from .blobs import response_digest, store_blobs
+from .metrics import timing_span
+from .models import QueryHistory, QueryResponse
+from .search import index_documents
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class HistoryWriter:
+    """Buffers QueryHistory rows and inserts them in batches from a background thread"""
+
+    def __init__(self, flush_size, flush_interval, max_pending):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def offer(self, entry):
+        """Queue a row; False if the buffer is full or closed and the caller should insert it"""
+        if self._closed:
+            return False
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            return False
+
+    def flush(self):
+        """Block until every queued row has been written"""
+        self.queue.join()
+
+    def close(self, timeout=10):
+        """Write pending rows and stop the thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            entry = self.queue.get()
+            if entry is _STOP:
+                self.queue.task_done()
+                break
+
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.flush_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            self._write(batch)
+            for _ in batch:
+                self.queue.task_done()
+        connections.close_all()
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            save_history_batch(batch)
+        except Exception as e:
+            logger.exception('History write error')
+            # retry row by row so one bad row doesn't drop the whole batch
+            for entry in batch:
+                try:
+                    entry.save()
+                except Exception as e:
+                    logger.exception('History write error')
+
+
+def get_writer():
+    """Shared write-behind writer for this process"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = HistoryWriter(
+                    flush_size=settings.HISTORY_FLUSH_SIZE,
+                    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+                    max_pending=settings.HISTORY_MAX_PENDING,
+                )
+                atexit.register(_writer.close)
+    return _writer
+
+
+def history_entry(responses=None, **fields):
+    """Unsaved QueryHistory row with its {provider: text} responses"""
+    entry = QueryHistory(**fields)
+    entry.set_responses(responses or {})
+    return entry
+
+
+def save_history(responses=None, write_behind=True, **fields):
+    """
+    Insert one QueryHistory row with its responses, or queue it when
+    write-behind is on. Pass write_behind=False when the caller needs the
+    row's id straight away.
+    """
+    entry = history_entry(responses, **fields)
+    if write_behind and settings.HISTORY_WRITE_BEHIND and get_writer().offer(entry):
+        return entry
+    with timing_span('db'):
+        entry.save()
+    return entry
+
+
+async def asave_history(responses=None, write_behind=True, **fields):
+    """Async version of save_history"""
+    entry = history_entry(responses, **fields)
+    if write_behind and settings.HISTORY_WRITE_BEHIND and get_writer().offer(entry):
+        return entry
+    with timing_span('db'):
+        await entry.asave()
+    return entry
+
+
+def save_history_batch(entries):
+    """Insert many QueryHistory rows with their responses, new blobs and search index entries"""
+    with timing_span('db'), transaction.atomic():
+        # bulk_create skips save(), so store the responses and index the rows here
+        pending = [entry.pop_pending_responses() for entry in entries]
+        try:
+            store_blobs({
+                response_digest(text): text for responses in pending for text in responses.values()
+            })
+            created = QueryHistory.objects.bulk_create(entries)
+            QueryResponse.objects.bulk_create([
+                row for entry, responses in zip(created, pending) for row in entry.response_rows(responses)
+            ])
+            index_documents([entry.search_document(responses) for entry, responses in zip(created, pending)])
+        except Exception:
+            # the transaction rolled back: reset the rows so they can be saved one by one
+            for entry, responses in zip(entries, pending):
+                entry.set_responses(responses)
+                entry.pk = None
+                entry._state.adding = True
+            raise
+        return created
@@ -0,0 +1,168 @@
+"""
+Request timing spans and Prometheus metrics
+
+`timing_span(name)` measures one stage of a request (a provider call, the
+rubric judge, auth, the history insert). Spans are collected per request by
+ServerTimingMiddleware and sent back in the `Server-Timing` header; every
+span also feeds the stage histogram served from /api/metrics.
+
+The registry is per process, so with several workers each one exposes its
+own series and Prometheus aggregates them.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# spans of the request being handled, set by ServerTimingMiddleware
+_request_spans = ContextVar('request_spans', default=None)
+
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', str(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return lines
+
+
+http_requests = Counter('http_requests_total', 'HTTP requests by view and status code', ('view', 'method', 'status'))
+http_request_duration = Histogram('http_request_duration_seconds', 'Time to response headers by view', ('view',))
+stage_duration = Histogram('ai_stage_duration_seconds', 'Duration of request stages (providers, rubric, auth, db)', ('stage',))
+provider_errors = Counter('ai_provider_errors_total', 'Failed provider calls', ('provider',))
+provider_tokens = Counter('ai_provider_tokens_total', 'Tokens reported by providers', ('provider', 'kind'))
+cache_requests = Counter('ai_cache_requests_total', 'Response and rubric cache lookups', ('cache', 'result'))
+hedged_requests = Counter('ai_hedged_requests_total', 'Hedged provider calls by which attempt answered first', ('provider', 'winner'))
+rubric_parses = Counter('ai_rubric_parses_total', 'Judge outputs parsed cleanly, repaired or rejected', ('result',))
+provider_rejections = Counter('ai_provider_rejections_total', 'Provider calls rejected by the circuit breaker or concurrency limit', ('provider', 'reason'))
+rate_limit_rejections = Counter('ai_rate_limit_rejections_total', 'Requests refused by the per-caller rate limit or daily quota', ('budget', 'reason'))
+
+REGISTRY = [
+    http_requests, http_request_duration, stage_duration, provider_errors, provider_tokens, cache_requests,
+    hedged_requests, provider_rejections, rubric_parses, rate_limit_rejections,
+]
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return '\n'.join(lines) + '\n'
+
+
+def record_span(name, duration):
+    """Record a finished stage; `duration` is in seconds"""
+    stage_duration.observe(duration, stage=name)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, duration))
+
+
+@contextmanager
+def timing_span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def cache_stats(cache):
+    return {
+        'hits': cache_requests.value(cache=cache, result='hit'),
+        'misses': cache_requests.value(cache=cache, result='miss'),
+    }
+
+
+def record_tokens(provider, prompt_tokens, completion_tokens):
+    if prompt_tokens:
+        provider_tokens.inc(prompt_tokens, provider=provider, kind='prompt')
+    if completion_tokens:
+        provider_tokens.inc(completion_tokens, provider=provider, kind='completion')
+
+
+def start_request_spans():
+    spans = []
+    return spans, _request_spans.set(spans)
+
+
+def end_request_spans(token):
+    _request_spans.reset(token)
+
+
+def server_timing_header(spans, total):
+    """Format spans as a Server-Timing header value (durations in ms)"""
+    entries = [f'{name};dur={duration * 1000:.1f}' for name, duration in spans]
+    entries.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(entries)
@@ -0,0 +1,53 @@
+"""
+API middleware
+"""
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    Collect timing spans for each request, report them in a `Server-Timing`
+    header and record request counts and latency per view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        spans, token = metrics.start_request_spans()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request_spans(token)
+        return self.finish(request, response, spans, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        spans, token = metrics.start_request_spans()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request_spans(token)
+        return self.finish(request, response, spans, start)
+
+    def finish(self, request, response, spans, start):
+        total = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+
+        metrics.http_requests.inc(view=view, method=request.method, status=response.status_code)
+        metrics.http_request_duration.observe(total, view=view)
+        response['Server-Timing'] = metrics.server_timing_header(spans, total)
+        return response
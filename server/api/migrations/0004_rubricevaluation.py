@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_user_bio_user_first_name_user_last_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RubricEvaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('judge_model', models.CharField(max_length=100)),
+                ('evaluator', models.CharField(max_length=100)),
+                ('rubric', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='queryhistory',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name_plural': 'Query Histories'},
+        ),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='queryhistory_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='queryhistory',
+            index=models.Index(fields=['user', 'mode', '-created_at', '-id'], name='queryhistory_user_mode'),
+        ),
+    ]
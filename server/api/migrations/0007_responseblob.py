@@ -0,0 +1,95 @@
+# Generated by Django 4.2.7 on 2026-10-18 12:10
+
+import hashlib
+import zlib
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+
+def compress_responses(apps, schema_editor):
+    """Move response text into compressed, deduplicated blobs"""
+    QueryHistory = apps.get_model('api', 'QueryHistory')
+    ResponseBlob = apps.get_model('api', 'ResponseBlob')
+
+    def flush(rows, blobs):
+        ResponseBlob.objects.bulk_create(blobs.values(), ignore_conflicts=True)
+        QueryHistory.objects.bulk_update(rows, ['response_groq_blob', 'response_gemini_blob'])
+
+    rows, blobs = [], {}
+    queryset = QueryHistory.objects.only('id', 'response_groq', 'response_gemini').order_by('id')
+    for row in queryset.iterator(chunk_size=BATCH_SIZE):
+        for text_field, blob_field in [('response_groq', 'response_groq_blob_id'),
+                                       ('response_gemini', 'response_gemini_blob_id')]:
+            text = getattr(row, text_field)
+            if text is None:
+                continue
+            digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+            if digest not in blobs:
+                blobs[digest] = ResponseBlob(digest=digest, data=zlib.compress(text.encode('utf-8')), size=len(text))
+            setattr(row, blob_field, digest)
+        rows.append(row)
+        if len(rows) >= BATCH_SIZE:
+            flush(rows, blobs)
+            rows, blobs = [], {}
+    if rows:
+        flush(rows, blobs)
+
+
+def restore_responses(apps, schema_editor):
+    """Copy blob text back into the response columns"""
+    QueryHistory = apps.get_model('api', 'QueryHistory')
+
+    def text(blob):
+        return zlib.decompress(blob.data).decode('utf-8') if blob else None
+
+    rows = []
+    queryset = QueryHistory.objects.select_related('response_groq_blob', 'response_gemini_blob').order_by('id')
+    for row in queryset.iterator(chunk_size=BATCH_SIZE):
+        row.response_groq = text(row.response_groq_blob)
+        row.response_gemini = text(row.response_gemini_blob)
+        rows.append(row)
+        if len(rows) >= BATCH_SIZE:
+            QueryHistory.objects.bulk_update(rows, ['response_groq', 'response_gemini'])
+            rows = []
+    if rows:
+        QueryHistory.objects.bulk_update(rows, ['response_groq', 'response_gemini'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_queryhistory_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='queryhistory',
+            name='response_groq_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.responseblob'),
+        ),
+        migrations.AddField(
+            model_name='queryhistory',
+            name='response_gemini_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.responseblob'),
+        ),
+        migrations.RunPython(compress_responses, restore_responses),
+        migrations.RemoveField(
+            model_name='queryhistory',
+            name='response_groq',
+        ),
+        migrations.RemoveField(
+            model_name='queryhistory',
+            name='response_gemini',
+        ),
+    ]
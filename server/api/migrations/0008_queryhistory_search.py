@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:05
+
+import zlib
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+SQLITE_CREATE = """
+    CREATE VIRTUAL TABLE api_queryhistory_fts USING fts5(
+        prompt, response_groq, response_gemini, content='', tokenize='porter unicode61'
+    )
+"""
+SQLITE_INSERT = 'INSERT INTO api_queryhistory_fts (rowid, prompt, response_groq, response_gemini) VALUES (%s, %s, %s, %s)'
+SQLITE_DROP = 'DROP TABLE IF EXISTS api_queryhistory_fts'
+
+POSTGRES_CREATE = [
+    """
+    CREATE TABLE api_queryhistory_search (
+        history_id bigint PRIMARY KEY REFERENCES api_queryhistory (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )
+    """,
+    'CREATE INDEX api_queryhistory_search_document ON api_queryhistory_search USING GIN (document)',
+]
+POSTGRES_INSERT = """
+    INSERT INTO api_queryhistory_search (history_id, document)
+    VALUES (%s, setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s || ' ' || %s), 'B'))
+"""
+POSTGRES_DROP = 'DROP TABLE IF EXISTS api_queryhistory_search'
+
+
+def create_search_index(apps, schema_editor):
+    """Create the engine's full-text index and fill it from existing history"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements, insert = [SQLITE_CREATE], SQLITE_INSERT
+    elif vendor == 'postgresql':
+        statements, insert = POSTGRES_CREATE, POSTGRES_INSERT
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+    def text(blob):
+        return zlib.decompress(blob.data).decode('utf-8') if blob else ''
+
+    QueryHistory = apps.get_model('api', 'QueryHistory')
+    queryset = QueryHistory.objects.select_related('response_groq_blob', 'response_gemini_blob').order_by('id')
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for row in queryset.iterator(chunk_size=BATCH_SIZE):
+            rows.append((row.id, row.prompt, text(row.response_groq_blob), text(row.response_gemini_blob)))
+            if len(rows) >= BATCH_SIZE:
+                cursor.executemany(insert, rows)
+                rows = []
+        if rows:
+            cursor.executemany(insert, rows)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_responseblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 500
+
+# registry entries of the two providers history was stored for until now
+PROVIDER_COLUMNS = [
+    ('groq', 'llama-3.3-70b-versatile', 'response_groq_blob_id'),
+    ('gemini', 'gemini-flash-latest', 'response_gemini_blob_id'),
+]
+
+
+def move_responses(apps, schema_editor):
+    """One QueryResponse row per non-empty response column"""
+    QueryHistory = apps.get_model('api', 'QueryHistory')
+    QueryResponse = apps.get_model('api', 'QueryResponse')
+
+    responses = []
+    queryset = QueryHistory.objects.only('id', 'response_groq_blob', 'response_gemini_blob').order_by('id')
+    for row in queryset.iterator(chunk_size=BATCH_SIZE):
+        for provider, model, column in PROVIDER_COLUMNS:
+            blob_id = getattr(row, column)
+            if blob_id is not None:
+                responses.append(QueryResponse(history_id=row.id, provider=provider, model=model, blob_id=blob_id))
+        if len(responses) >= BATCH_SIZE:
+            QueryResponse.objects.bulk_create(responses)
+            responses = []
+    if responses:
+        QueryResponse.objects.bulk_create(responses)
+
+
+def restore_columns(apps, schema_editor):
+    """Copy groq and gemini responses back into their columns; others are dropped"""
+    QueryHistory = apps.get_model('api', 'QueryHistory')
+    QueryResponse = apps.get_model('api', 'QueryResponse')
+    columns = {provider: column for provider, _, column in PROVIDER_COLUMNS}
+
+    rows = {}
+    queryset = QueryResponse.objects.filter(provider__in=columns).order_by('history_id')
+    for response in queryset.iterator(chunk_size=BATCH_SIZE):
+        # flush between rows only, so both columns of a row are written together
+        if response.history_id not in rows and len(rows) >= BATCH_SIZE:
+            QueryHistory.objects.bulk_update(rows.values(), ['response_groq_blob', 'response_gemini_blob'])
+            rows = {}
+        row = rows.setdefault(response.history_id, QueryHistory(id=response.history_id))
+        setattr(row, columns[response.provider], response.blob_id)
+    if rows:
+        QueryHistory.objects.bulk_update(rows.values(), ['response_groq_blob', 'response_gemini_blob'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_queryhistory_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=50)),
+                ('model', models.CharField(blank=True, default='', max_length=100)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.responseblob')),
+                ('history', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='api.queryhistory')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='queryresponse',
+            constraint=models.UniqueConstraint(fields=('history', 'provider'), name='queryresponse_history_provider'),
+        ),
+        migrations.RunPython(move_responses, restore_columns),
+        migrations.RemoveField(
+            model_name='queryhistory',
+            name='response_groq_blob',
+        ),
+        migrations.RemoveField(
+            model_name='queryhistory',
+            name='response_gemini_blob',
+        ),
+    ]
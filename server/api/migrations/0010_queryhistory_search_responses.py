@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:25
+
+import zlib
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# the PostgreSQL index holds a single tsvector per row and keeps its shape;
+# the SQLite FTS table had one column per provider and is rebuilt
+DROP = 'DROP TABLE IF EXISTS api_queryhistory_fts'
+CREATE = """
+    CREATE VIRTUAL TABLE api_queryhistory_fts USING fts5(
+        prompt, responses, content='', tokenize='porter unicode61'
+    )
+"""
+INSERT = 'INSERT INTO api_queryhistory_fts (rowid, prompt, responses) VALUES (%s, %s, %s)'
+OLD_CREATE = """
+    CREATE VIRTUAL TABLE api_queryhistory_fts USING fts5(
+        prompt, response_groq, response_gemini, content='', tokenize='porter unicode61'
+    )
+"""
+OLD_INSERT = 'INSERT INTO api_queryhistory_fts (rowid, prompt, response_groq, response_gemini) VALUES (%s, %s, %s, %s)'
+
+
+def _documents(apps):
+    """(id, prompt, {provider: text}) of every history row"""
+    QueryHistory = apps.get_model('api', 'QueryHistory')
+    QueryResponse = apps.get_model('api', 'QueryResponse')
+    rows = QueryHistory.objects.only('id', 'prompt').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(rows.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        responses = {}
+        queryset = QueryResponse.objects.filter(history_id__in=[row.id for row in batch]).select_related('blob')
+        for response in queryset.order_by('id'):
+            text = zlib.decompress(response.blob.data).decode('utf-8')
+            responses.setdefault(response.history_id, {})[response.provider] = text
+        for row in batch:
+            yield row.id, row.prompt, responses.get(row.id, {})
+
+
+def _rebuild(apps, schema_editor, create, insert, fields):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP)
+    schema_editor.execute(create)
+    rows = []
+    with schema_editor.connection.cursor() as cursor:
+        for row_id, prompt, responses in _documents(apps):
+            rows.append((row_id, prompt, *fields(responses)))
+            if len(rows) >= BATCH_SIZE:
+                cursor.executemany(insert, rows)
+                rows = []
+        if rows:
+            cursor.executemany(insert, rows)
+
+
+def index_all_responses(apps, schema_editor):
+    _rebuild(apps, schema_editor, CREATE, INSERT, lambda responses: ['\n\n'.join(responses.values())])
+
+
+def index_provider_columns(apps, schema_editor):
+    _rebuild(
+        apps, schema_editor, OLD_CREATE, OLD_INSERT,
+        lambda responses: [responses.get('groq', ''), responses.get('gemini', '')],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_queryresponse'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_all_responses, index_provider_columns),
+    ]
@@ -1,6 +1,9 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
+from .blobs import response_digest, decompress, store_blobs
+from .search import index_documents
 
 
 class UserManager(BaseUserManager):
@@ -30,6 +33,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(default=timezone.now)
+    # bump to revoke every token issued to this user
+    token_version = models.PositiveIntegerField(default=0)
     
     # user profile fields
     first_name = models.CharField(max_length=30, blank=True, null=True)
@@ -47,20 +52,122 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.email
 
 
+class ResponseBlob(models.Model):
+    """A provider response, stored once and zlib-compressed (see api/blobs.py)"""
+    
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField()  # uncompressed length in characters
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} chars)"
+
+
+class QueryHistoryQuerySet(models.QuerySet):
+    def with_responses(self):
+        """Load each row's responses (and their blobs) with one extra query"""
+        return self.prefetch_related(
+            models.Prefetch('responses', queryset=QueryResponse.objects.select_related('blob'))
+        )
+
+
 class QueryHistory(models.Model):
     """Store user's query history"""
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='queries')
     prompt = models.TextField()
-    response_groq = models.TextField(blank=True, null=True)
-    response_gemini = models.TextField(blank=True, null=True)
     mode = models.CharField(max_length=20, default='both')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = QueryHistoryQuerySet.as_manager()
+    
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
         verbose_name_plural = 'Query Histories'
+        indexes = [
+            # keyset pagination of a user's history, optionally by mode
+            models.Index(fields=['user', '-created_at', '-id'], name='queryhistory_user_created'),
+            models.Index(fields=['user', 'mode', '-created_at', '-id'], name='queryhistory_user_mode'),
+        ]
+    
+    def set_responses(self, responses):
+        """Set the {provider: text} responses to store with this row when it is saved"""
+        self.__dict__['_pending_responses'] = {
+            provider: text for provider, text in responses.items() if text is not None
+        }
+    
+    def pop_pending_responses(self):
+        """Responses set on this row that have not been stored yet"""
+        return self.__dict__.pop('_pending_responses', {})
+    
+    def response_texts(self):
+        """{provider: text} of this row's responses"""
+        pending = self.__dict__.get('_pending_responses')
+        if pending is not None:
+            return dict(pending)
+        return {response.provider: response.text for response in self.responses.all()}
+    
+    def response_rows(self, responses):
+        """Unsaved QueryResponse rows for {provider: text} responses of this (saved) row"""
+        return [
+            QueryResponse(
+                history=self,
+                provider=provider,
+                model=settings.AI_PROVIDERS.get(provider, {}).get('model', ''),
+                blob_id=response_digest(text),
+            )
+            for provider, text in responses.items()
+        ]
+    
+    def search_document(self, responses):
+        """(id, prompt, responses) for the search index (api/search.py)"""
+        return (self.id, self.prompt, '\n\n'.join(responses.values()))
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        responses = self.pop_pending_responses()
+        with transaction.atomic():
+            store_blobs({response_digest(text): text for text in responses.values()})
+            super().save(*args, **kwargs)
+            QueryResponse.objects.bulk_create(self.response_rows(responses))
+            if adding:
+                index_documents([self.search_document(responses)])
     
     def __str__(self):
         return f"{self.user.email} - {self.prompt[:50]}... ({self.created_at})"
 
+
+class QueryResponse(models.Model):
+    """One provider's response in a history entry; the text is a ResponseBlob"""
+    
+    history = models.ForeignKey(QueryHistory, on_delete=models.CASCADE, related_name='responses')
+    provider = models.CharField(max_length=50)  # registry name, e.g. 'groq'
+    model = models.CharField(max_length=100, blank=True, default='')
+    blob = models.ForeignKey(ResponseBlob, on_delete=models.PROTECT, related_name='+')
+    
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['history', 'provider'], name='queryresponse_history_provider'),
+        ]
+    
+    @property
+    def text(self):
+        return decompress(self.blob.data)
+    
+    def __str__(self):
+        return f"{self.provider} response to #{self.history_id}"
+
+
+class RubricEvaluation(models.Model):
+    """Parsed judge output, addressed by a digest of what was judged"""
+    
+    digest = models.CharField(max_length=64, unique=True)
+    judge_model = models.CharField(max_length=100)
+    evaluator = models.CharField(max_length=100)
+    rubric = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.evaluator} - {self.digest[:12]} ({self.created_at})"
@@ -0,0 +1,75 @@
+"""
+Keyset (cursor) pagination for query history
+
+Pages are ordered newest first on (created_at, id) and the cursor is the
+position of the last row sent, so each page is an index range scan on
+(user, created_at, id) no matter how deep the client pages, unlike OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+
+
+def encode_cursor(row):
+    position = json.dumps([row.created_at.isoformat(), row.id])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def parse_page_size(value):
+    """Page size from a query parameter, capped at HISTORY_MAX_PAGE_SIZE"""
+    if value in (None, ''):
+        return settings.HISTORY_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if size < 1:
+        raise ValueError('limit must be at least 1')
+    return min(size, settings.HISTORY_MAX_PAGE_SIZE)
+
+
+def parse_offset(cursor):
+    """
+    Offset from a ranked-results cursor. Search results are ordered by
+    relevance, not by an indexed key, so they are paged by offset.
+    """
+    if cursor in (None, ''):
+        return 0
+    try:
+        offset = int(cursor)
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    return offset
+
+
+def keyset_page(queryset, page_size, cursor=None):
+    """
+    One page of `queryset`, newest first, starting after `cursor`.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id))
+
+    # fetch one extra row to know whether there is a next page
+    rows = list(queryset[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,693 @@
+"""
+AI provider clients and calls
+
+Providers are entries of the AI_PROVIDERS registry in settings, each with a
+`kind` (the client to use: 'groq', 'gemini' or 'openai' for any
+OpenAI-compatible server), a model and optional limits. Everything here is
+addressed by the provider's registry name, so another Groq model, a second
+Gemini tier or a local server is a config entry, not new code.
+
+Provider clients are built once per process and shared across threads, so
+repeated calls reuse the same HTTP keep-alive connections and TLS sessions
+instead of building a new client on every request.
+
+Provider SDKs are imported when the first client of their kind is built
+(load_sdk), not when this module is: the Gemini SDK alone pulls in gRPC and
+protobuf and takes most of a second, which every manage.py command and
+worker boot would otherwise pay. See api/warmup.py to load them at worker
+start instead.
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+import weakref
+from datetime import datetime
+import httpx
+from django.conf import settings
+from .cache import make_request_key, cached_call, cached_call_async
+from .deadline import hedged_call, hedged_call_async
+from .metrics import timing_span, provider_errors, record_tokens
+from .resilience import guard, ProviderUnavailable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TOKENS = 1000
+# per-call timeout of OpenAI-compatible servers without a `timeout` or deadline
+DEFAULT_TIMEOUT = 60
+
+# settings holding the API key of each kind, unless an entry sets `api_key_env`
+API_KEY_SETTINGS = {
+    'groq': 'GROQ_API_KEY',
+    'gemini': 'GEMINI_API_KEY',
+}
+
+
+class ProviderHTTPError(Exception):
+    """Error status from an OpenAI-compatible server"""
+
+    def __init__(self, status, message):
+        super().__init__(f'HTTP {status}: {message}')
+        self.status = status
+
+
+class ProviderRateLimited(ProviderHTTPError):
+    pass
+
+
+# Exception classes by what they mean for a call:
+# - 'fatal': the client is thrown away and rebuilt on next use;
+# - 'timeout': the call ran out of time (for Groq also an APIConnectionError,
+#   but the connection is fine and the client is kept);
+# - 'rate_limit': the provider is throttling us (HTTP 429);
+# - 'provider': the provider itself is failing (5xx, connection errors, 429),
+#   which is what its circuit breaker counts.
+# SDK classes are added by load_sdk, since an SDK that was never imported
+# can't have raised anything.
+ERRORS = {
+    'fatal': (httpx.TransportError,),
+    'timeout': (TimeoutError, httpx.TimeoutException),
+    'rate_limit': (ProviderRateLimited,),
+    'provider': (httpx.TransportError,),
+}
+
+
+def _groq_errors(groq):
+    return {
+        'fatal': (groq.APIConnectionError, groq.AuthenticationError),
+        'timeout': (groq.APITimeoutError,),
+        'rate_limit': (groq.RateLimitError,),
+        'provider': (groq.APIConnectionError, groq.InternalServerError, groq.RateLimitError),
+    }
+
+
+def _gemini_errors(genai):
+    import requests
+    from google.api_core import exceptions
+    return {
+        'fatal': (exceptions.Unauthenticated, exceptions.PermissionDenied, exceptions.ServiceUnavailable),
+        'timeout': (exceptions.DeadlineExceeded, requests.exceptions.Timeout),
+        'rate_limit': (exceptions.TooManyRequests, exceptions.ResourceExhausted),
+        'provider': (
+            exceptions.ServerError, exceptions.TooManyRequests, exceptions.ResourceExhausted,
+            requests.exceptions.ConnectionError,
+        ),
+    }
+
+
+# SDK module and error classes of each kind that has one
+SDKS = {
+    'groq': ('groq', _groq_errors),
+    'gemini': ('google.generativeai', _gemini_errors),
+}
+_loaded_sdks = set()
+_sdk_lock = threading.Lock()
+
+
+def load_sdk(kind):
+    """The SDK module of provider kind `kind`, imported and its errors registered on first use"""
+    module_name, errors = SDKS[kind]
+    module = importlib.import_module(module_name)
+    if kind not in _loaded_sdks:
+        with _sdk_lock:
+            if kind not in _loaded_sdks:
+                for meaning, types in errors(module).items():
+                    ERRORS[meaning] += types
+                _loaded_sdks.add(kind)
+    return module
+
+
+def is_fatal(error):
+    """Whether the client that raised `error` should be rebuilt"""
+    return isinstance(error, ERRORS['fatal']) and not isinstance(error, ERRORS['timeout'])
+
+
+def is_timeout(error):
+    return isinstance(error, ERRORS['timeout'])
+
+
+def is_throttled(error):
+    return isinstance(error, ERRORS['rate_limit'])
+
+
+def is_provider_failure(error):
+    """
+    Whether `error` says the provider is failing, rather than the call: a
+    timeout (usually the request's own deadline) or a bad request doesn't.
+    """
+    if is_timeout(error):
+        return False
+    if isinstance(error, ProviderHTTPError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, ERRORS['provider'])
+
+
+def provider_config(name):
+    """Registry entry of provider `name`; raises ValueError for unknown names"""
+    try:
+        return settings.AI_PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f'Unknown provider: {name}')
+
+
+def provider_label(name):
+    return provider_config(name).get('label', name)
+
+
+def selected_providers(data):
+    """
+    Provider names a request asks for with `providers` (a list or a
+    comma-separated string), defaulting to AI_DEFAULT_PROVIDERS.
+    """
+    names = data.get('providers') or settings.AI_DEFAULT_PROVIDERS
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        raise ValueError('providers must be a list of provider names')
+    unknown = [name for name in names if name not in settings.AI_PROVIDERS]
+    if unknown:
+        raise ValueError(f"Unknown providers: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+
+def _api_key(config):
+    """(setting or env var name, key) for a provider's API key"""
+    if config.get('api_key_env'):
+        return config['api_key_env'], os.getenv(config['api_key_env'])
+    setting = API_KEY_SETTINGS.get(config['kind'])
+    return setting, getattr(settings, setting) if setting else None
+
+
+def missing_key_result(name):
+    """Result dict for a provider whose API key is not configured, or None"""
+    config = provider_config(name)
+    setting, key = _api_key(config)
+    if setting is None or key:
+        return None
+    return {
+        'model': provider_label(name),
+        'response': 'API key not configured',
+        'error': f'Please configure {setting} in .env file'
+    }
+
+
+def _http_limits(config):
+    # registry entries may size their own pool
+    return httpx.Limits(
+        max_connections=config.get('max_connections', settings.PROVIDER_MAX_CONNECTIONS),
+        max_keepalive_connections=config.get('max_keepalive_connections', settings.PROVIDER_MAX_KEEPALIVE_CONNECTIONS),
+        keepalive_expiry=settings.PROVIDER_KEEPALIVE_EXPIRY,
+    )
+
+
+def _openai_headers(config):
+    _, key = _api_key(config)
+    return {'Authorization': f'Bearer {key}'} if key else {}
+
+
+# SDK clients don't retry on their own: a retry of a call that timed out
+# would run past the request's deadline, and retried 429s would never reach
+# the breaker or concurrency limit (hedging covers slow calls instead)
+
+def _build_groq_client(config):
+    return load_sdk('groq').Groq(
+        api_key=_api_key(config)[1],
+        base_url=config.get('base_url') or settings.GROQ_BASE_URL,
+        http_client=httpx.Client(limits=_http_limits(config)),
+        max_retries=0,
+    )
+
+
+def _build_async_groq_client(config):
+    return load_sdk('groq').AsyncGroq(
+        api_key=_api_key(config)[1],
+        base_url=config.get('base_url') or settings.GROQ_BASE_URL,
+        http_client=httpx.AsyncClient(limits=_http_limits(config)),
+        max_retries=0,
+    )
+
+
+def _build_openai_client(config):
+    return httpx.Client(
+        base_url=config['base_url'], headers=_openai_headers(config),
+        limits=_http_limits(config), timeout=DEFAULT_TIMEOUT,
+    )
+
+
+def _build_async_openai_client(config):
+    return httpx.AsyncClient(
+        base_url=config['base_url'], headers=_openai_headers(config),
+        limits=_http_limits(config), timeout=DEFAULT_TIMEOUT,
+    )
+
+
+def _gemini_transport():
+    # custom endpoints (e.g. bench/fake_providers.py) speak the REST wire format
+    if settings.GEMINI_BASE_URL:
+        return 'rest'
+    return settings.GEMINI_TRANSPORT
+
+
+def _build_gemini_client(config):
+    # the Gemini SDK keeps one gRPC channel per configure() call, and all
+    # requests are multiplexed over it; the configuration is process-wide,
+    # so every Gemini entry shares GEMINI_API_KEY and GEMINI_BASE_URL
+    genai = load_sdk('gemini')
+    client_options = None
+    if settings.GEMINI_BASE_URL:
+        client_options = {'api_endpoint': settings.GEMINI_BASE_URL}
+    genai.configure(
+        api_key=_api_key(config)[1],
+        transport=_gemini_transport(),
+        client_options=client_options,
+    )
+    return genai.GenerativeModel(config['model'])
+
+
+def _close_client(client):
+    client.close()
+
+
+class ProviderClientRegistry:
+    """Process-wide registry of provider clients, safe to share across threads"""
+
+    builders = {
+        'groq': _build_groq_client,
+        'gemini': _build_gemini_client,
+        'openai': _build_openai_client,
+    }
+    closers = {
+        'groq': _close_client,
+        'openai': _close_client,
+    }
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    config = provider_config(name)
+                    client = self.builders[config['kind']](config)
+                    self._clients[name] = client
+        return client
+
+    def reset(self, name, client=None):
+        """
+        Drop a client so the next get() builds a new one.
+
+        If `client` is given the reset only happens when it is still the
+        registered client, so concurrent failures rebuild it just once.
+        """
+        with self._lock:
+            current = self._clients.get(name)
+            if current is None or (client is not None and current is not client):
+                return
+            del self._clients[name]
+
+        closer = self.closers.get(provider_config(name)['kind'])
+        if closer:
+            try:
+                closer(current)
+            except Exception as e:
+                logger.warning('Error closing %s client: %s', name, e)
+
+    def handle_error(self, name, client, error):
+        """Rebuild the client after a fatal error"""
+        if is_fatal(error):
+            self.reset(name, client)
+
+
+class AsyncProviderClientRegistry:
+    """
+    Registry of async provider clients.
+
+    Async HTTP clients are bound to the event loop that created them, so one
+    set of clients is kept per running loop (normally one per ASGI worker).
+    """
+
+    builders = {
+        'groq': _build_async_groq_client,
+        'openai': _build_async_openai_client,
+    }
+    closers = {
+        'groq': lambda client: client.close(),
+        'openai': lambda client: client.aclose(),
+    }
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _loop_clients(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            return self._clients.setdefault(loop, {})
+
+    def get(self, name):
+        loop_clients = self._loop_clients()
+        client = loop_clients.get(name)
+        if client is None:
+            config = provider_config(name)
+            client = self.builders[config['kind']](config)
+            loop_clients[name] = client
+        return client
+
+    def handle_error(self, name, client, error):
+        """Rebuild the client after a fatal error"""
+        if not is_fatal(error):
+            return
+        loop_clients = self._loop_clients()
+        if loop_clients.get(name) is client:
+            del loop_clients[name]
+            close = self.closers[provider_config(name)['kind']]
+            asyncio.get_running_loop().create_task(close(client))
+
+
+clients = ProviderClientRegistry()
+async_clients = AsyncProviderClientRegistry()
+
+
+def _groq_usage(usage):
+    return (usage.prompt_tokens, usage.completion_tokens) if usage else None
+
+
+def _gemini_usage(usage):
+    return (usage.prompt_token_count, usage.candidates_token_count) if usage else None
+
+
+def _openai_usage(usage):
+    return (usage.get('prompt_tokens'), usage.get('completion_tokens')) if usage else None
+
+
+def _groq_options(timeout, json_mode=False):
+    options = {}
+    if timeout:
+        options['timeout'] = timeout
+    if json_mode:
+        options['response_format'] = {'type': 'json_object'}
+    return options
+
+
+def _gemini_options(timeout, json_mode=False, max_tokens=None):
+    # retry=None turns off the SDK's default retry of 503s
+    options = {'request_options': {'retry': None}}
+    if timeout:
+        options['request_options']['timeout'] = timeout
+    generation_config = {}
+    if json_mode:
+        generation_config['response_mime_type'] = 'application/json'
+    if max_tokens:
+        generation_config['max_output_tokens'] = max_tokens
+    if generation_config:
+        options['generation_config'] = generation_config
+    return options
+
+
+def _openai_payload(config, prompt, max_tokens, json_mode=False, stream=False):
+    payload = {
+        'model': config['model'],
+        'messages': [{"role": "user", "content": prompt}],
+        'max_tokens': max_tokens or DEFAULT_MAX_TOKENS,
+    }
+    if json_mode:
+        payload['response_format'] = {'type': 'json_object'}
+    if stream:
+        payload['stream'] = True
+    return payload
+
+
+def _openai_check(response):
+    if response.status_code == 429:
+        raise ProviderRateLimited(429, response.text[:200])
+    if response.status_code >= 400:
+        raise ProviderHTTPError(response.status_code, response.text[:200])
+
+
+def _openai_timeout(timeout):
+    return timeout if timeout else httpx.USE_CLIENT_DEFAULT
+
+
+# one call per kind: (client, config, prompt, max_tokens, timeout, json_mode) -> (text, usage)
+
+def _groq_chat(client, config, prompt, max_tokens, timeout, json_mode):
+    completion = client.chat.completions.create(
+        model=config['model'],
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
+        **_groq_options(timeout, json_mode),
+    )
+    return completion.choices[0].message.content, _groq_usage(completion.usage)
+
+
+def _gemini_chat(model, config, prompt, max_tokens, timeout, json_mode):
+    result = model.generate_content(prompt, **_gemini_options(timeout, json_mode, max_tokens))
+    return result.text, _gemini_usage(result.usage_metadata)
+
+
+def _openai_chat(client, config, prompt, max_tokens, timeout, json_mode):
+    response = client.post(
+        'chat/completions', json=_openai_payload(config, prompt, max_tokens, json_mode),
+        timeout=_openai_timeout(timeout),
+    )
+    _openai_check(response)
+    data = response.json()
+    return data['choices'][0]['message']['content'], _openai_usage(data.get('usage'))
+
+
+async def _groq_chat_async(client, config, prompt, max_tokens, timeout, json_mode):
+    completion = await client.chat.completions.create(
+        model=config['model'],
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
+        **_groq_options(timeout, json_mode),
+    )
+    return completion.choices[0].message.content, _groq_usage(completion.usage)
+
+
+async def _gemini_chat_async(model, config, prompt, max_tokens, timeout, json_mode):
+    result = await model.generate_content_async(prompt, **_gemini_options(timeout, json_mode, max_tokens))
+    return result.text, _gemini_usage(result.usage_metadata)
+
+
+async def _openai_chat_async(client, config, prompt, max_tokens, timeout, json_mode):
+    response = await client.post(
+        'chat/completions', json=_openai_payload(config, prompt, max_tokens, json_mode),
+        timeout=_openai_timeout(timeout),
+    )
+    _openai_check(response)
+    data = response.json()
+    return data['choices'][0]['message']['content'], _openai_usage(data.get('usage'))
+
+
+CHAT = {'groq': _groq_chat, 'gemini': _gemini_chat, 'openai': _openai_chat}
+CHAT_ASYNC = {'groq': _groq_chat_async, 'gemini': _gemini_chat_async, 'openai': _openai_chat_async}
+
+
+def _slot_wait(timeout):
+    """How long a call may wait for a concurrency slot: AI_LIMIT_QUEUE_TIMEOUT, within its timeout"""
+    if timeout:
+        return min(settings.AI_LIMIT_QUEUE_TIMEOUT, timeout)
+    return settings.AI_LIMIT_QUEUE_TIMEOUT
+
+
+def chat(name, prompt, max_tokens=None, timeout=None, json_mode=False):
+    """Run a single-turn prompt on provider `name` and return the text; `json_mode` asks for a JSON object"""
+    config = provider_config(name)
+    client = clients.get(name)
+    with guard(name, is_provider_failure, is_throttled, _slot_wait(timeout)) as call:
+        try:
+            with timing_span(name):
+                text, usage = CHAT[config['kind']](
+                    client, config, prompt, max_tokens or config.get('max_tokens'), call.time_left(timeout), json_mode,
+                )
+        except Exception as e:
+            provider_errors.inc(provider=name)
+            clients.handle_error(name, client, e)
+            raise
+    if usage:
+        record_tokens(name, *usage)
+    return text
+
+
+async def chat_async(name, prompt, max_tokens=None, timeout=None, json_mode=False):
+    """Async version of chat"""
+    config = provider_config(name)
+    if config['kind'] == 'gemini':
+        if _gemini_transport() == 'rest':
+            # the SDK has no async REST client, so run the sync call off the event loop
+            return await asyncio.to_thread(chat, name, prompt, max_tokens, timeout, json_mode)
+        # the gRPC model object serves sync and async calls
+        registry = clients
+    else:
+        registry = async_clients
+    client = registry.get(name)
+    async with guard(name, is_provider_failure, is_throttled, _slot_wait(timeout)) as call:
+        try:
+            with timing_span(name):
+                text, usage = await CHAT_ASYNC[config['kind']](
+                    client, config, prompt, max_tokens or config.get('max_tokens'), call.time_left(timeout), json_mode,
+                )
+        except Exception as e:
+            provider_errors.inc(provider=name)
+            registry.handle_error(name, client, e)
+            raise
+    if usage:
+        record_tokens(name, *usage)
+    return text
+
+
+# one stream per kind: yields text deltas and passes token usage to `on_usage`
+
+def _groq_stream(client, config, prompt, max_tokens, on_usage):
+    stream = client.chat.completions.create(
+        model=config['model'],
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens or DEFAULT_MAX_TOKENS,
+        stream=True,
+    )
+    for chunk in stream:
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            yield delta
+        usage = getattr(chunk, 'x_groq', None) and chunk.x_groq.usage
+        if usage:
+            on_usage(_groq_usage(usage))
+
+
+def _gemini_stream(model, config, prompt, max_tokens, on_usage):
+    response = model.generate_content(prompt, stream=True, **_gemini_options(None, max_tokens=max_tokens))
+    for chunk in response:
+        if chunk.parts:
+            yield chunk.text
+    on_usage(_gemini_usage(response.usage_metadata))
+
+
+def _openai_stream(client, config, prompt, max_tokens, on_usage):
+    payload = _openai_payload(config, prompt, max_tokens, stream=True)
+    with client.stream('POST', 'chat/completions', json=payload) as response:
+        if response.status_code >= 400:
+            response.read()
+            _openai_check(response)
+        for line in response.iter_lines():
+            if not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            delta = chunk['choices'][0].get('delta', {}).get('content') if chunk.get('choices') else None
+            if delta:
+                yield delta
+            if chunk.get('usage'):
+                on_usage(_openai_usage(chunk['usage']))
+
+
+STREAM = {'groq': _groq_stream, 'gemini': _gemini_stream, 'openai': _openai_stream}
+
+
+def stream(name, prompt, max_tokens=None):
+    """Yield the text deltas of provider `name`'s answer as they arrive"""
+    config = provider_config(name)
+    client = clients.get(name)
+
+    def on_usage(usage):
+        if usage:
+            record_tokens(name, *usage)
+
+    with guard(name, is_provider_failure, is_throttled, _slot_wait(None)):
+        try:
+            with timing_span(name):
+                yield from STREAM[config['kind']](
+                    client, config, prompt, max_tokens or config.get('max_tokens'), on_usage,
+                )
+        except Exception as e:
+            provider_errors.inc(provider=name)
+            clients.handle_error(name, client, e)
+            raise
+
+
+def request_key(name, prompt):
+    """Cache key of provider `name`'s answer to `prompt`"""
+    config = provider_config(name)
+    params = {}
+    if config['kind'] != 'gemini' or config.get('max_tokens'):
+        params['max_tokens'] = config.get('max_tokens', DEFAULT_MAX_TOKENS)
+    if config['kind'] == 'openai':
+        params['base_url'] = config['base_url']
+    return make_request_key(config['kind'], config['model'], prompt, params)
+
+
+def failed_result(model, error):
+    """Result dict for a provider call that raised `error`"""
+    result = {
+        'model': model,
+        'error': str(error) or type(error).__name__,
+        'response': f'Failed to get response from {model}',
+    }
+    if is_timeout(error):
+        result['timed_out'] = True
+    if isinstance(error, ProviderUnavailable):
+        result['unavailable'] = True
+        result['retry_after'] = error.retry_after
+    return result
+
+
+def _call_timeout(name, timeout):
+    """The tighter of the deadline's `timeout` and the provider's own `timeout`"""
+    limits = [value for value in (timeout, provider_config(name).get('timeout')) if value]
+    return min(limits) if limits else None
+
+
+def get_response(name, prompt, use_cache=True, deadline=None):
+    """Get provider `name`'s response to `prompt`, within `deadline` if given"""
+    missing = missing_key_result(name)
+    if missing:
+        return missing
+
+    return cached_call(request_key(name, prompt), lambda: _call(name, prompt, deadline), use_cache)
+
+
+def _call(name, prompt, deadline=None):
+    label = provider_label(name)
+    try:
+        return {
+            'model': label,
+            'response': hedged_call(
+                name, lambda timeout: chat(name, prompt, timeout=_call_timeout(name, timeout)), deadline,
+            ),
+            'timestamp': datetime.now().isoformat(),
+        }
+    except Exception as e:
+        logger.warning('%s error: %s', label, e)
+        return failed_result(label, e)
+
+
+async def get_response_async(name, prompt, use_cache=True, deadline=None):
+    """Async version of get_response"""
+    missing = missing_key_result(name)
+    if missing:
+        return missing
+
+    return await cached_call_async(request_key(name, prompt), lambda: _call_async(name, prompt, deadline), use_cache)
+
+
+async def _call_async(name, prompt, deadline=None):
+    label = provider_label(name)
+    try:
+        return {
+            'model': label,
+            'response': await hedged_call_async(
+                name, lambda timeout: chat_async(name, prompt, timeout=_call_timeout(name, timeout)), deadline,
+            ),
+            'timestamp': datetime.now().isoformat(),
+        }
+    except Exception as e:
+        logger.warning('%s error: %s', label, e)
+        return failed_result(label, e)
@@ -0,0 +1,190 @@
+"""
+Per-caller rate limits and daily quotas for the AI endpoints
+
+A caller is the user of a valid access token, or the client IP for
+anonymous requests. For each budget in RATE_LIMITS ('compare' for plain
+provider calls, 'rubric' for requests that may also run the judge, see
+rubric_budget) a caller has
+
+- a token bucket: every request takes one token, and tokens refill at
+  `per_minute` up to `burst`, so short bursts pass but a steady stream is
+  held to the rate;
+- a daily quota: the prompts a request carries (one, or a batch's length)
+  count against `daily` until midnight UTC.
+
+Views check before any provider call and answer 429 with a Retry-After
+header when either is used up. The quota is checked first, and its prompts
+are given back if the bucket then turns the request away. A batch with
+more prompts than the whole daily quota is answered 413 up front, as
+waiting would not help.
+
+Counters live in this process unless RATE_LIMIT_CACHE_ALIAS names a Django
+cache that all workers share. There, quota counters use the cache's incr;
+bucket updates are read-modify-write, so workers racing on one caller can
+let a request or two past the rate. If the store fails, requests are let
+through rather than refused.
+"""
+import logging
+import math
+import threading
+import time
+from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from .metrics import rate_limit_rejections
+
+DAY = 86400
+
+logger = logging.getLogger(__name__)
+
+
+def _refill(state, rate, burst, now):
+    tokens, updated = state or (burst, now)
+    return min(burst, tokens + (now - updated) * rate)
+
+
+class LocalStore:
+    """Buckets and quota counters of this process"""
+
+    def __init__(self, max_keys):
+        self._buckets = TTLCache(maxsize=max_keys, ttl=DAY)
+        self._counts = TTLCache(maxsize=max_keys, ttl=DAY)
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """Take a token; 0 if there was one, else seconds until there is"""
+        with self._lock:
+            tokens = _refill(self._buckets.get(key), rate, burst, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def add(self, key, amount, limit):
+        """Add `amount` to a counter unless that takes it past `limit`"""
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if count + amount > limit:
+                return False
+            self._counts[key] = count + amount
+            return True
+
+    def remove(self, key, amount):
+        """Give back `amount` added to a counter"""
+        with self._lock:
+            self._counts[key] = max(0, self._counts.get(key, 0) - amount)
+
+
+class SharedStore:
+    """Buckets and quota counters in a Django cache shared by all workers"""
+
+    key_prefix = 'ratelimit:'
+
+    def __init__(self, alias):
+        self._cache = caches[alias]
+
+    def take(self, key, rate, burst, now):
+        key = self.key_prefix + key
+        tokens = _refill(self._cache.get(key), rate, burst, now)
+        # an idle bucket is full again after burst / rate seconds
+        timeout = math.ceil(burst / rate) + 1
+        if tokens < 1:
+            self._cache.set(key, (tokens, now), timeout=timeout)
+            return (1 - tokens) / rate
+        self._cache.set(key, (tokens - 1, now), timeout=timeout)
+        return 0
+
+    def add(self, key, amount, limit):
+        key = self.key_prefix + key
+        self._cache.add(key, 0, timeout=DAY)
+        if self._cache.incr(key, amount) > limit:
+            self._cache.decr(key, amount)
+            return False
+        return True
+
+    def remove(self, key, amount):
+        self._cache.decr(self.key_prefix + key, amount)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.RATE_LIMIT_CACHE_ALIAS:
+                    _store = SharedStore(settings.RATE_LIMIT_CACHE_ALIAS)
+                else:
+                    _store = LocalStore(settings.RATE_LIMIT_MAX_KEYS)
+    return _store
+
+
+def client_key(request, user):
+    """'user:<id>', or 'ip:<address>' for anonymous requests"""
+    if user:
+        return f'user:{user.id}'
+    address = ''
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        address = request.headers.get('X-Forwarded-For', '').split(',')[0].strip()
+    return f"ip:{address or request.META.get('REMOTE_ADDR', '')}"
+
+
+def rubric_budget(mode, with_rubric=True):
+    """'rubric' for requests that may call the judge; 'fast' rubrics are scored locally"""
+    return 'rubric' if with_rubric and mode != 'fast' else 'compare'
+
+
+def _rejected(budget, reason, retry_after, message):
+    rate_limit_rejections.inc(budget=budget, reason=reason)
+    seconds = max(1, math.ceil(retry_after))
+    response = JsonResponse({'error': message, 'retry_after': seconds}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def check_rate_limit(request, user, budget, prompts=1):
+    """
+    Take a request from the caller's `budget`; None if it may go ahead,
+    otherwise the 429 (or 413, for a batch over the daily quota) response
+    to return.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return None
+    limits = settings.RATE_LIMITS[budget]
+    if 0 < limits['daily'] < prompts:
+        rate_limit_rejections.inc(budget=budget, reason='size')
+        return JsonResponse({
+            'error': f"At most {limits['daily']} prompts per day for {budget} requests",
+        }, status=413)
+    key = f'{budget}:{client_key(request, user)}'
+    now = time.time()
+    try:
+        store = get_store()
+        quota_key = f'{key}:{int(now // DAY)}'
+        if limits['daily'] > 0 and not store.add(quota_key, prompts, limits['daily']):
+            return _rejected(
+                budget, 'quota', DAY - now % DAY,
+                f"Daily {budget} quota of {limits['daily']} prompts used up",
+            )
+        if limits['per_minute'] > 0:
+            wait = store.take(key, limits['per_minute'] / 60, max(1, limits['burst']), now)
+            if wait:
+                if limits['daily'] > 0:
+                    store.remove(quota_key, prompts)
+                return _rejected(budget, 'rate', wait, 'Too many requests, slow down')
+    except Exception:
+        logger.exception('Rate limit error')
+    return None
+
+
+async def acheck_rate_limit(request, user, budget, prompts=1):
+    """Async version of check_rate_limit"""
+    if isinstance(get_store(), LocalStore):
+        return check_rate_limit(request, user, budget, prompts)
+    return await sync_to_async(check_rate_limit)(request, user, budget, prompts)
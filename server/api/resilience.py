@@ -0,0 +1,283 @@
+"""
+Circuit breakers and adaptive concurrency limits for provider calls
+
+Every provider call runs inside `guard(provider)`, which combines:
+
+- a circuit breaker: after AI_BREAKER_FAILURE_THRESHOLD failures in a row
+  the provider is marked open and calls fail fast for
+  AI_BREAKER_RESET_TIMEOUT seconds, after which a few probe calls are let
+  through (half-open) to decide whether to close it again;
+- an AIMD concurrency limit: the number of calls allowed in flight grows by
+  about one per round of successful calls and is cut when the provider
+  rate-limits us (429) or gets much slower than its usual latency, so we
+  back off before the provider starts throttling everyone.
+
+Calls against an open breaker raise ProviderUnavailable immediately. Calls
+over the limit wait up to AI_LIMIT_QUEUE_TIMEOUT seconds (or what is left
+of their deadline, if less) for a slot before they are refused. Only errors
+that say the provider is failing (5xx, connection errors, 429) count against
+the breaker; a call that timed out on its request's deadline or was refused
+as a bad request is released without a verdict. Breaker state is reported
+by the health endpoint.
+"""
+import asyncio
+import math
+import threading
+import time
+from asyncio import CancelledError
+from django.conf import settings
+from .metrics import provider_rejections
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProviderUnavailable(Exception):
+    """A call was rejected without reaching the provider; retry after `retry_after` seconds"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout, half_open_calls):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probes = 0
+
+    def blocked(self, now):
+        """Whether the breaker is open and still cooling down"""
+        return self.state == OPEN and now - self.opened_at < self.reset_timeout
+
+    def allow(self, now):
+        """Whether a call may go through; call with the guard's lock held"""
+        if self.state == OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.state == HALF_OPEN:
+            if self.probes >= self.half_open_calls:
+                return False
+            self.probes += 1
+        return True
+
+    def retry_after(self, now):
+        """Seconds until an open breaker lets probe calls through again"""
+        if self.state != OPEN:
+            return 0
+        return max(0.0, self.reset_timeout - (now - self.opened_at))
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self, now):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now
+
+
+class AdaptiveLimit:
+    """Additive-increase / multiplicative-decrease limit on calls in flight"""
+
+    def __init__(self, initial, minimum, maximum, latency_tolerance):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.latency_ewma = None
+
+    def on_success(self, latency):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        slow = latency > self.latency_ewma * self.latency_tolerance
+        self.latency_ewma = 0.9 * self.latency_ewma + 0.1 * latency
+        if slow:
+            self.limit = max(self.minimum, self.limit * 0.9)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_throttled(self):
+        self.limit = max(self.minimum, self.limit * 0.5)
+
+
+class ProviderGuard:
+    """Breaker and concurrency limit for one provider"""
+
+    def __init__(self, name):
+        self.name = name
+        self.breaker = CircuitBreaker(
+            settings.AI_BREAKER_FAILURE_THRESHOLD,
+            settings.AI_BREAKER_RESET_TIMEOUT,
+            settings.AI_BREAKER_HALF_OPEN_CALLS,
+        )
+        # registry entries may cap their own concurrency with `max_in_flight`
+        maximum = settings.AI_PROVIDERS.get(name, {}).get('max_in_flight', settings.AI_LIMIT_MAX)
+        self.limit = AdaptiveLimit(
+            min(settings.AI_LIMIT_INITIAL, maximum),
+            settings.AI_LIMIT_MIN,
+            maximum,
+            settings.AI_LIMIT_LATENCY_TOLERANCE,
+        )
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+
+    def _take(self, now):
+        """Take a slot; None if taken, else why not. Call with the lock held"""
+        if self.breaker.blocked(now):
+            return 'circuit_open'
+        if self.in_flight >= int(self.limit.limit):
+            return 'concurrency_limit'
+        if not self.breaker.allow(now):
+            # half-open, and the probe calls are already out
+            return 'circuit_open'
+        self.in_flight += 1
+        return None
+
+    def _refused(self, reason):
+        with self._lock:
+            wait = self.breaker.retry_after(time.monotonic())
+        provider_rejections.inc(provider=self.name, reason=reason)
+        return ProviderUnavailable(f"{self.name} unavailable ({reason.replace('_', ' ')})", max(1, math.ceil(wait)))
+
+    def acquire(self, max_wait=0):
+        """Take a slot, waiting up to `max_wait` seconds for one while the provider is at its limit"""
+        give_up = time.monotonic() + max_wait
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                reason = self._take(now)
+                if reason != 'concurrency_limit' or now >= give_up:
+                    break
+                self._slot_free.wait(give_up - now)
+        if reason:
+            raise self._refused(reason)
+
+    async def acquire_async(self, max_wait=0):
+        """acquire() for async callers; polls for a slot rather than block the event loop"""
+        give_up = time.monotonic() + max_wait
+        delay = 0.005
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                reason = self._take(now)
+            if reason != 'concurrency_limit' or now >= give_up:
+                break
+            await asyncio.sleep(min(delay, give_up - now))
+            delay = min(delay * 2, 0.1)
+        if reason:
+            raise self._refused(reason)
+
+    def release(self, latency, error=None, throttled=False):
+        """Record the outcome of a call; `error` is None on success"""
+        with self._lock:
+            self.in_flight -= 1
+            self._slot_free.notify()
+            if error is None:
+                self.breaker.record_success()
+                self.limit.on_success(latency)
+            else:
+                self.breaker.record_failure(time.monotonic())
+                if throttled:
+                    self.limit.on_throttled()
+
+    def cancel(self):
+        """
+        Release a call that was abandoned (cancelled hedge, closed stream) or
+        that failed in a way that says nothing about the provider.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self._slot_free.notify()
+            # an unanswered half-open probe must not block the next one
+            if self.breaker.state == HALF_OPEN:
+                self.breaker.probes = max(0, self.breaker.probes - 1)
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.breaker.state,
+                'consecutive_failures': self.breaker.failures,
+                'concurrency_limit': int(self.limit.limit),
+                'in_flight': self.in_flight,
+            }
+
+
+class guard:
+    """
+    Run a provider call under its provider's breaker and limit.
+
+        with guard('groq', is_failure, is_throttled, max_wait=5) as call:
+            client.chat.completions.create(..., timeout=call.time_left(timeout))
+
+    `is_failure(exc)` tells whether an exception counts against the breaker
+    (all do by default) and `is_throttled(exc)` whether it is a 429 that
+    should cut the concurrency limit. A call at the provider's limit waits
+    up to `max_wait` seconds for a slot. Use `async with` in async code; it
+    also works inside generators.
+    """
+
+    def __init__(self, name, is_failure=None, is_throttled=None, max_wait=0):
+        self.provider = get_guard(name)
+        self.is_failure = is_failure or (lambda exc: True)
+        self.is_throttled = is_throttled or (lambda exc: False)
+        self.max_wait = max_wait
+        self.waited = 0
+
+    def __enter__(self):
+        queued = time.monotonic()
+        self.provider.acquire(self.max_wait)
+        self.start = time.monotonic()
+        self.waited = self.start - queued
+        return self
+
+    async def __aenter__(self):
+        queued = time.monotonic()
+        await self.provider.acquire_async(self.max_wait)
+        self.start = time.monotonic()
+        self.waited = self.start - queued
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def time_left(self, timeout):
+        """`timeout` less the time spent waiting for a slot"""
+        if timeout is None:
+            return None
+        return max(0.001, timeout - self.waited)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, (GeneratorExit, CancelledError)):
+            self.provider.cancel()
+        elif exc is not None and not self.is_failure(exc):
+            self.provider.cancel()
+        else:
+            self.provider.release(time.monotonic() - self.start, exc, exc is not None and self.is_throttled(exc))
+        return False
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(name):
+    provider = _guards.get(name)
+    if provider is None:
+        with _guards_lock:
+            provider = _guards.setdefault(name, ProviderGuard(name))
+    return provider
+
+
+def provider_health(names):
+    """Breaker state and concurrency limit of each provider"""
+    return {name: get_guard(name).status() for name in names}
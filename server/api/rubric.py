@@ -0,0 +1,269 @@
+"""
+AI-judged comparison rubric
+
+Judge results are stored in RubricEvaluation under a digest of the prompt,
+both responses and the judge model, so judging the same pair again is a
+single indexed lookup instead of another LLM call. Only the judge's own
+results are stored: one from the fallback judge is returned with
+`"fallback": true` but not kept under the judge's digest, so the pair is
+judged again once the judge is back.
+
+The rubric mode picks the tier: 'llm' asks the judge, 'fast' returns the
+local heuristic scores from fast_rubric, and 'auto' computes those first and
+only asks the judge when neither response clearly wins.
+"""
+import hashlib
+import json
+import logging
+from django.conf import settings
+from .deadline import timeout_for
+from .metrics import record_cache, timing_span
+from .models import RubricEvaluation
+from .rubric_json import parse_rubric_text
+from .providers import chat, chat_async, is_timeout, provider_config
+from .resilience import ProviderUnavailable
+from .singleflight import flights, async_flights
+
+logger = logging.getLogger(__name__)
+
+# registry names of the judge and the fallback judge
+JUDGE = 'gemini'
+FALLBACK_JUDGE = 'groq'
+JUDGE_MODEL = provider_config(JUDGE)['model']
+# the rubric compares these two providers' responses
+RUBRIC_PROVIDERS = ('groq', 'gemini')
+# bump when the judge prompt changes so stored evaluations are not reused
+RUBRIC_VERSION = 1
+RUBRIC_MODES = ('llm', 'fast', 'auto')
+
+
+def rubric_digest(prompt, groq_response, gemini_response, judge_model=JUDGE_MODEL):
+    """Content address of a rubric evaluation"""
+    payload = json.dumps([RUBRIC_VERSION, judge_model, prompt, groq_response, gemini_response])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_comparison_prompt(prompt, groq_response, gemini_response):
+    return f"""You are an expert AI evaluator. Compare these two AI responses to the same prompt and provide a detailed evaluation.
+
+Original Prompt: {prompt}
+
+Response A (Groq/Llama 3.3): {groq_response}
+
+Response B (Gemini): {gemini_response}
+
+Please evaluate both responses using the following rubric (score each criterion from 1-10):
+
+1. **Accuracy**: How factually correct and reliable is the information?
+2. **Relevance**: How well does it address the prompt?
+3. **Clarity**: How clear and easy to understand is the response?
+4. **Completeness**: How thorough and comprehensive is the answer?
+5. **Usefulness**: How practical and helpful is the response?
+
+Provide your evaluation in the following JSON format:
+{{
+    "response_a": {{
+        "accuracy": <score>,
+        "relevance": <score>,
+        "clarity": <score>,
+        "completeness": <score>,
+        "usefulness": <score>,
+        "total": <sum of all scores>,
+        "strengths": ["strength 1", "strength 2"],
+        "weaknesses": ["weakness 1", "weakness 2"]
+    }},
+    "response_b": {{
+        "accuracy": <score>,
+        "relevance": <score>,
+        "clarity": <score>,
+        "completeness": <score>,
+        "usefulness": <score>,
+        "total": <sum of all scores>,
+        "strengths": ["strength 1", "strength 2"],
+        "weaknesses": ["weakness 1", "weakness 2"]
+    }},
+    "overall_comparison": "Brief summary of which is better and why",
+    "recommendation": "Which response would you recommend and why?"
+}}"""
+
+
+def _stored_result(stored):
+    return {
+        'success': True,
+        'rubric': stored.rubric,
+        'evaluator': stored.evaluator,
+        'cached': True,
+    }
+
+
+def _store_defaults(result):
+    return {
+        'judge_model': JUDGE_MODEL,
+        'evaluator': result['evaluator'],
+        'rubric': result['rubric'],
+    }
+
+
+def skipped_rubric():
+    """Evaluation result when one of the responses is missing"""
+    return {
+        'success': False,
+        'skipped': True,
+        'error': 'Rubric needs responses from both models',
+    }
+
+
+def rubric_mode(data):
+    """Rubric tier requested with `"mode"`, defaulting to AI_RUBRIC_MODE"""
+    mode = data.get('mode') or settings.AI_RUBRIC_MODE
+    if mode not in RUBRIC_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(RUBRIC_MODES)}")
+    return mode
+
+
+def local_rubric(prompt, groq_response, gemini_response, mode):
+    """
+    Heuristic result for 'fast' mode, or for 'auto' when it is decisive;
+    None means the LLM judge should decide.
+    """
+    if mode == 'llm':
+        return None
+    # imported here so numpy is only loaded once a local rubric is asked for
+    from .fast_rubric import fast_rubric, is_decisive
+    with timing_span('rubric_fast'):
+        result = fast_rubric(prompt, groq_response, gemini_response)
+    if mode == 'fast':
+        return result
+    if is_decisive(result):
+        result['gated'] = True
+        return result
+    return None
+
+
+def get_ai_comparison_rubric(prompt, groq_response, gemini_response, deadline=None, mode='llm'):
+    """Return the stored rubric for these responses, judging them if needed (within `deadline`)"""
+    local = local_rubric(prompt, groq_response, gemini_response, mode)
+    if local:
+        return local
+
+    with timing_span('rubric'):
+        digest = rubric_digest(prompt, groq_response, gemini_response)
+
+        stored = RubricEvaluation.objects.filter(digest=digest).first()
+        record_cache('rubric', hit=stored is not None)
+        if stored:
+            return _stored_result(stored)
+
+        # identical judge requests running at the same time share one LLM call
+        result = flights.do(
+            digest,
+            lambda: evaluate_and_store(digest, build_comparison_prompt(prompt, groq_response, gemini_response), deadline),
+        )
+        result['cached'] = False
+        return result
+
+
+def evaluate_and_store(digest, comparison_prompt, deadline=None):
+    result = run_rubric_judge(comparison_prompt, deadline)
+    if result.get('success') and not result.get('fallback'):
+        RubricEvaluation.objects.get_or_create(digest=digest, defaults=_store_defaults(result))
+    return result
+
+
+def _judge_deadline(deadline):
+    # leave the fallback judge part of the budget
+    return deadline.split(settings.AI_DEADLINE_BUDGETS['judge']) if deadline else None
+
+
+def _judge_failed(error):
+    result = {
+        'success': False,
+        'error': 'Failed to generate comparison rubric',
+        'details': str(error) or type(error).__name__,
+    }
+    if is_timeout(error):
+        result['timed_out'] = True
+    if isinstance(error, ProviderUnavailable):
+        result['unavailable'] = True
+        result['retry_after'] = error.retry_after
+    return result
+
+
+def run_rubric_judge(comparison_prompt, deadline=None):
+    """Ask Gemini (falling back to Groq) to fill in the rubric JSON"""
+    try:
+        # use Gemini for comparison and parse JSON
+        rubric = parse_rubric_text(chat(JUDGE, comparison_prompt, timeout=timeout_for(_judge_deadline(deadline)), json_mode=True))
+        return {
+            'success': True,
+            'rubric': rubric,
+            'evaluator': 'Gemini Flash'
+        }
+    except Exception as e:
+        logger.warning('Rubric generation error: %s', e)
+        # fallback: try with Groq
+        try:
+            rubric = parse_rubric_text(chat(FALLBACK_JUDGE, comparison_prompt, max_tokens=2000, timeout=timeout_for(deadline), json_mode=True))
+            return {
+                'success': True,
+                'rubric': rubric,
+                'evaluator': 'Groq Llama 3.3',
+                'fallback': True,
+            }
+        except Exception as e2:
+            logger.error('Fallback rubric error: %s', e2)
+            return _judge_failed(e2)
+
+
+async def get_ai_comparison_rubric_async(prompt, groq_response, gemini_response, deadline=None, mode='llm'):
+    """Async version of get_ai_comparison_rubric"""
+    # the heuristics take milliseconds, so they run inline
+    local = local_rubric(prompt, groq_response, gemini_response, mode)
+    if local:
+        return local
+
+    with timing_span('rubric'):
+        digest = rubric_digest(prompt, groq_response, gemini_response)
+
+        stored = await RubricEvaluation.objects.filter(digest=digest).afirst()
+        record_cache('rubric', hit=stored is not None)
+        if stored:
+            return _stored_result(stored)
+
+        result = await async_flights.do(
+            digest,
+            lambda: evaluate_and_store_async(digest, build_comparison_prompt(prompt, groq_response, gemini_response), deadline),
+        )
+        result['cached'] = False
+        return result
+
+
+async def evaluate_and_store_async(digest, comparison_prompt, deadline=None):
+    result = await run_rubric_judge_async(comparison_prompt, deadline)
+    if result.get('success') and not result.get('fallback'):
+        await RubricEvaluation.objects.aget_or_create(digest=digest, defaults=_store_defaults(result))
+    return result
+
+
+async def run_rubric_judge_async(comparison_prompt, deadline=None):
+    """Async version of run_rubric_judge"""
+    try:
+        rubric = parse_rubric_text(await chat_async(JUDGE, comparison_prompt, timeout=timeout_for(_judge_deadline(deadline)), json_mode=True))
+        return {
+            'success': True,
+            'rubric': rubric,
+            'evaluator': 'Gemini Flash'
+        }
+    except Exception as e:
+        logger.warning('Rubric generation error: %s', e)
+        try:
+            rubric = parse_rubric_text(await chat_async(FALLBACK_JUDGE, comparison_prompt, max_tokens=2000, timeout=timeout_for(deadline), json_mode=True))
+            return {
+                'success': True,
+                'rubric': rubric,
+                'evaluator': 'Groq Llama 3.3',
+                'fallback': True,
+            }
+        except Exception as e2:
+            logger.error('Fallback rubric error: %s', e2)
+            return _judge_failed(e2)
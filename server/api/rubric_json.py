@@ -0,0 +1,269 @@
+"""
+Tolerant parsing of judge output into a validated rubric
+
+Judges sometimes wrap the rubric in prose or a code fence, leave trailing
+commas, use typographic quotes or stop mid-object when they hit the token
+limit. Rather than asking a second judge whenever json.loads fails, the
+outermost JSON object is cut out of the reply, common defects are repaired,
+and the result is checked against the rubric schema: every criterion needs a
+score (clamped to 1-10), and totals are recomputed here instead of trusting
+the judge's arithmetic. Repairs never touch the text inside strings, and a
+rubric that lost a field to them is rejected rather than filled in. Only
+output that is still unusable after that raises RubricParseError, which is
+what sends the request to the fallback judge.
+"""
+import json
+import re
+from .metrics import rubric_parses
+
+CRITERIA = ('accuracy', 'relevance', 'clarity', 'completeness', 'usefulness')
+SECTIONS = ('response_a', 'response_b')
+TEXT_FIELDS = ('overall_comparison', 'recommendation')
+
+# typographic double quotes a judge may use to delimit strings
+SMART_QUOTES = '“”'
+LEADING_NUMBER = re.compile(r'\s*(\d+(?:\.\d+)?)')
+
+# how many trailing fields may be dropped from a truncated object
+MAX_TRUNCATION_CUTS = 20
+
+
+class RubricParseError(ValueError):
+    pass
+
+
+def extract_object(text):
+    """The outermost JSON object in `text`, up to the end if it is never closed"""
+    start = text.find('{')
+    if start == -1:
+        raise RubricParseError('No JSON object in judge output')
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def _close(text):
+    """Terminate an open string and close any open brackets"""
+    closers = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            closers.append('}')
+        elif char == '[':
+            closers.append(']')
+        elif char in '}]' and closers:
+            closers.pop()
+    if in_string:
+        text += '"'
+    return text + ''.join(reversed(closers))
+
+
+def _structure(text):
+    """(index, char) of the characters outside strings, and of each opening quote"""
+    in_string = False
+    escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        else:
+            if char == '"':
+                in_string = True
+            yield index, char
+
+
+def _drop_trailing_commas(text):
+    drop = []
+    comma = None
+    for index, char in _structure(text):
+        if char.isspace():
+            continue
+        if char in '}]' and comma is not None:
+            drop.append(comma)
+        comma = index if char == ',' else None
+    for index in reversed(drop):
+        text = text[:index] + text[index + 1:]
+    return text
+
+
+def _last_comma(text):
+    """Index of the last comma between fields, or -1"""
+    commas = [index for index, char in _structure(text) if char == ',']
+    return commas[-1] if commas else -1
+
+
+def _ends_string(text, index):
+    # a closing delimiter is followed by what may come after a JSON string:
+    # a colon, a closing bracket, or a comma and the next value
+    rest = text[index:].lstrip()
+    if rest[:1] == ',':
+        rest = rest[1:].lstrip()
+        return not rest or rest[0] in '"{[' + SMART_QUOTES
+    return not rest or rest[0] in ':}]'
+
+
+def _plain_quotes(text):
+    """
+    Plain quotes for the typographic quotes that delimit strings; quotes
+    inside a string's text are kept (or escaped, if plain).
+    """
+    out = []
+    in_string = False
+    typographic = False
+    escaped = False
+    for index, char in enumerate(text):
+        if not in_string:
+            if char == '"' or char in SMART_QUOTES:
+                in_string = True
+                typographic = char != '"'
+                char = '"'
+        elif escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif not typographic:
+            in_string = char != '"'
+        elif char == '"' or char in SMART_QUOTES:
+            if _ends_string(text, index + 1):
+                in_string = False
+                char = '"'
+            elif char == '"':
+                char = '\\"'
+        out.append(char)
+    return ''.join(out)
+
+
+def _load_complete(text):
+    """
+    The object in `text`, trailing fields dropped one comma at a time until
+    it loads and closed if it was truncated; None if that fails or costs a
+    top-level field.
+    """
+    for _ in range(MAX_TRUNCATION_CUTS):
+        try:
+            data = json.loads(_close(_drop_trailing_commas(text.rstrip().rstrip(',:'))))
+        except json.JSONDecodeError:
+            cut = _last_comma(text)
+            if cut == -1:
+                return None
+            text = text[:cut]
+            continue
+        if isinstance(data, dict) and all(field in data for field in SECTIONS + TEXT_FIELDS):
+            return data
+        return None
+    return None
+
+
+def repair_json(candidate):
+    """
+    Load a damaged JSON object.
+
+    Drops trailing commas and closes a truncated object; only if that fails
+    are typographic quotes used as string delimiters made plain.
+    """
+    data = _load_complete(candidate)
+    if data is None:
+        plain = _plain_quotes(candidate)
+        if plain != candidate:
+            data = _load_complete(plain)
+    if data is None:
+        raise RubricParseError('Judge output is not repairable JSON')
+    return data
+
+
+def _score(value):
+    if isinstance(value, str):
+        # "8", "8/10", "8.5 (good)"
+        match = LEADING_NUMBER.match(value)
+        value = float(match.group(1)) if match else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RubricParseError(f'Invalid score: {value!r}')
+    return min(10, max(1, int(round(value))))
+
+
+def _text_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [str(item) for item in value if item not in (None, '')]
+    raise RubricParseError(f'Expected a list of strings, got {value!r}')
+
+
+def validate_rubric(data):
+    """Normalize a parsed rubric to the schema, or raise RubricParseError"""
+    if not isinstance(data, dict):
+        raise RubricParseError('Rubric is not an object')
+
+    rubric = {}
+    for section in SECTIONS:
+        scores = data.get(section)
+        if not isinstance(scores, dict):
+            raise RubricParseError(f'Missing {section}')
+        missing = [criterion for criterion in CRITERIA if criterion not in scores]
+        if missing:
+            raise RubricParseError(f"Missing {section} scores: {', '.join(missing)}")
+
+        normalized = {criterion: _score(scores[criterion]) for criterion in CRITERIA}
+        normalized['total'] = sum(normalized.values())
+        normalized['strengths'] = _text_list(scores.get('strengths'))
+        normalized['weaknesses'] = _text_list(scores.get('weaknesses'))
+        rubric[section] = normalized
+
+    for field in TEXT_FIELDS:
+        if data.get(field) is None:
+            raise RubricParseError(f'Missing {field}')
+        rubric[field] = str(data[field])
+    return rubric
+
+
+def parse_rubric_text(response_text):
+    """Rubric from a judge reply; raises RubricParseError if it is unusable"""
+    try:
+        candidate = extract_object(response_text or '')
+        try:
+            data = json.loads(candidate)
+            outcome = 'clean'
+        except json.JSONDecodeError:
+            data = repair_json(candidate)
+            outcome = 'repaired'
+        rubric = validate_rubric(data)
+    except RubricParseError:
+        rubric_parses.inc(result='failed')
+        raise
+    rubric_parses.inc(result=outcome)
+    return rubric
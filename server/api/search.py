@@ -0,0 +1,138 @@
+"""
+Full-text search over query history
+
+The index lives next to api_queryhistory and is picked by the database
+engine configured in get_database_config:
+
+- SQLite: a contentless FTS5 table (porter stemming) whose rowid is the
+  history id, ranked with bm25;
+- PostgreSQL: a tsvector per row in api_queryhistory_search with a GIN
+  index, ranked with ts_rank_cd.
+
+Both index the prompt (weighted higher) and all responses. Responses are
+stored compressed (see api/blobs.py), so rows are indexed from Python when
+they are inserted (QueryHistory.save and save_history_batch) rather than by
+triggers, and neither index keeps a copy of the text; snippets are
+highlighted here from the decompressed rows of the page being returned.
+
+Deleted rows leave entries behind in the SQLite index, but search joins on
+api_queryhistory and ids are never reused, so they are never returned.
+"""
+import html
+import re
+from django.db import DEFAULT_DB_ALIAS, connections
+
+FTS_TABLE = 'api_queryhistory_fts'
+TSVECTOR_TABLE = 'api_queryhistory_search'
+
+TERM = re.compile(r'\w+')
+MAX_TERMS = 16
+# characters of context on each side of the first match in a snippet
+SNIPPET_CONTEXT = 80
+STEM_SUFFIXES = ('ing', 'ed', 'es', 's', 'ly')
+
+SQLITE_INSERT = f'INSERT INTO {FTS_TABLE} (rowid, prompt, responses) VALUES (%s, %s, %s)'
+POSTGRES_INSERT = f"""
+    INSERT INTO {TSVECTOR_TABLE} (history_id, document)
+    VALUES (%s, setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B'))
+    ON CONFLICT (history_id) DO NOTHING
+"""
+
+SQLITE_SEARCH = f"""
+    SELECT h.id, -bm25({FTS_TABLE}, 4.0, 1.0) AS score
+    FROM {FTS_TABLE} JOIN api_queryhistory h ON h.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s AND h.user_id = %s
+    ORDER BY score DESC, h.id DESC
+    LIMIT %s OFFSET %s
+"""
+POSTGRES_SEARCH = f"""
+    SELECT h.id, ts_rank_cd(s.document, query) AS score
+    FROM {TSVECTOR_TABLE} s
+    JOIN api_queryhistory h ON h.id = s.history_id,
+    plainto_tsquery('english', %s) query
+    WHERE s.document @@ query AND h.user_id = %s
+    ORDER BY score DESC, h.id DESC
+    LIMIT %s OFFSET %s
+"""
+
+
+class SearchUnavailable(Exception):
+    """The database engine has no full-text index"""
+
+
+def search_terms(query):
+    """Lower-cased words of a search query"""
+    return TERM.findall((query or '').lower())[:MAX_TERMS]
+
+
+def index_documents(documents, using=DEFAULT_DB_ALIAS):
+    """Add (history_id, prompt, responses) rows to the index"""
+    if not documents:
+        return
+    connection = connections[using]
+    params = [(row_id, prompt or '', responses or '') for row_id, prompt, responses in documents]
+    if connection.vendor == 'sqlite':
+        sql = SQLITE_INSERT
+    elif connection.vendor == 'postgresql':
+        sql = POSTGRES_INSERT
+    else:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def search_history(user_id, query, limit, offset=0, using=DEFAULT_DB_ALIAS):
+    """
+    [(history_id, score)] of the user's rows matching every term of
+    `query`, best first.
+    """
+    terms = search_terms(query)
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        # quoted terms are matched literally and ANDed
+        sql, match = SQLITE_SEARCH, ' '.join(f'"{term}"' for term in terms)
+    elif connection.vendor == 'postgresql':
+        sql, match = POSTGRES_SEARCH, ' '.join(terms)
+    else:
+        raise SearchUnavailable(f'Search is not supported on {connection.vendor}')
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [match, user_id, limit, offset])
+        return [(row_id, float(score)) for row_id, score in cursor.fetchall()]
+
+
+def _stem(term):
+    for suffix in STEM_SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+def highlighter(terms):
+    """Pattern matching the words a stemmed index would match for `terms`"""
+    stems = sorted({_stem(term) for term in terms}, key=len, reverse=True)
+    # a stem plus a short inflection: 'collect' matches 'collection' but 'w17' not 'w173'
+    return re.compile(r'\b(?:' + '|'.join(re.escape(stem) for stem in stems) + r')[a-z]{0,4}\b', re.IGNORECASE)
+
+
+def highlight(text, pattern):
+    """
+    HTML-escaped snippet around the first match in `text` with matches
+    wrapped in <mark>, or None if nothing matches.
+    """
+    if not text:
+        return None
+    first = pattern.search(text)
+    if first is None:
+        return None
+    start = max(0, first.start() - SNIPPET_CONTEXT)
+    end = min(len(text), first.end() + SNIPPET_CONTEXT)
+    snippet = text[start:end]
+
+    parts = []
+    position = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[position:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        position = match.end()
+    parts.append(html.escape(snippet[position:]))
+    return ('…' if start > 0 else '') + ''.join(parts) + ('…' if end < len(text) else '')
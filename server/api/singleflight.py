@@ -0,0 +1,110 @@
+"""
+Single-flight coalescing of duplicate in-flight calls
+
+When several threads ask for the same key at the same time, only the first
+one (the leader) runs the call. The others wait for it and get a copy of the
+same result, or the same exception. Nothing is remembered once the call is
+finished; caching is left to the caller.
+
+An async leader that is cancelled (e.g. its request timed out) doesn't pass
+the cancellation on: its waiters start over and one of them leads instead.
+"""
+import asyncio
+import copy
+import threading
+import weakref
+
+
+class _LeaderCancelled(Exception):
+    """Set on a flight whose async leader was cancelled"""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+            # the leader's caller may mutate its result, so waiters get their own copy
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Asyncio version of SingleFlight; calls are only shared within one event loop"""
+
+    def __init__(self):
+        self._calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _loop_calls(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            return self._calls.setdefault(loop, {})
+
+    async def do(self, key, func):
+        calls = self._loop_calls()
+        while key in calls:
+            try:
+                return copy.deepcopy(await asyncio.shield(calls[key]))
+            except _LeaderCancelled:
+                # the leader was cancelled, not this caller: run the call again
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        calls[key] = future
+        try:
+            result = await func()
+            future.set_result(copy.deepcopy(result))
+            return result
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # mark the exception as retrieved when nobody was waiting
+            future.exception()
+            raise
+        finally:
+            del calls[key]
+
+
+# shared by all provider and judge calls in this process
+flights = SingleFlight()
+async_flights = AsyncSingleFlight()
@@ -0,0 +1,142 @@
+"""
+Server-Sent Events stream for the compare endpoint
+
+Both providers stream on the shared fan-out pool and push their deltas into
+one queue, so the client sees tokens from each provider as soon as they
+arrive. Events sent, in order of arrival:
+
+    event: delta     {"provider": "groq", "text": "..."}
+    event: response  {"provider": "groq", "model": "Groq", "response": "...", ...}
+    event: rubric    {"success": true, "rubric": {...}, ...}   (optional)
+    event: done      {}
+
+If the providers have not both answered by the request's deadline, the
+stream ends with an error event instead.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from django.conf import settings
+from .cache import get_response_cache
+from .deadline import DeadlineExceeded
+from .fanout import get_executor
+from .history import save_history
+from .providers import missing_key_result, provider_label, request_key, stream
+from .rubric import get_ai_comparison_rubric, RUBRIC_PROVIDERS
+
+STREAM_PROVIDERS = RUBRIC_PROVIDERS
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_result(name, label, prompt, use_cache, events, cancelled):
+    """Stream one provider's answer into the queue; its final result, or None if cancelled"""
+    missing = missing_key_result(name)
+    if missing:
+        return missing
+
+    key = request_key(name, prompt)
+    cache = get_response_cache() if settings.AI_CACHE_ENABLED else None
+    result = cache.get(key) if cache is not None and use_cache else None
+    if result is not None:
+        events.put(('delta', name, result['response']))
+        result['cached'] = True
+        return result
+
+    parts = []
+    for text in stream(name, prompt):
+        if cancelled.is_set():
+            return None
+        parts.append(text)
+        events.put(('delta', name, text))
+    result = {
+        'model': label,
+        'response': ''.join(parts),
+        'timestamp': datetime.now().isoformat(),
+    }
+    if cache is not None:
+        cache.set(key, result)
+    result['cached'] = False
+    return result
+
+
+def _pump(name, prompt, use_cache, events, cancelled):
+    """Stream one provider into the event queue, then always put its final result"""
+    label = provider_label(name)
+    start = time.perf_counter()
+    try:
+        result = _stream_result(name, label, prompt, use_cache, events, cancelled)
+        if result is None:
+            return
+    except Exception as e:
+        logger.exception('%s stream error', label)
+        result = {
+            'model': label,
+            'error': str(e),
+            'response': f"Failed to get response from {label}",
+        }
+
+    result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    events.put(('response', name, result))
+
+
+def compare_event_stream(prompt, user=None, use_cache=True, with_rubric=True, rubric_mode='llm', deadline=None):
+    """Yield SSE events for a streamed comparison and save history at the end"""
+    events = queue.Queue()
+    cancelled = threading.Event()
+    executor = get_executor()
+    for name in STREAM_PROVIDERS:
+        executor.submit(_pump, name, prompt, use_cache, events, cancelled)
+
+    try:
+        results = {}
+        while len(results) < len(STREAM_PROVIDERS):
+            try:
+                kind, name, payload = events.get(timeout=deadline.remaining() if deadline else None)
+            except queue.Empty:
+                raise DeadlineExceeded('Deadline exceeded before every provider answered')
+            if kind == 'delta':
+                yield sse_event('delta', {'provider': name, 'text': payload})
+            else:
+                results[name] = payload
+                yield sse_event('response', {'provider': name, **payload})
+
+        failed = any(result.get('error') for result in results.values())
+        mode = 'both'
+        if with_rubric and not failed:
+            evaluation = get_ai_comparison_rubric(
+                prompt,
+                results['groq'].get('response'),
+                results['gemini'].get('response'),
+                deadline=deadline,
+                mode=rubric_mode,
+            )
+            yield sse_event('rubric', evaluation)
+            mode = 'compare_with_rubric'
+            failed = not evaluation.get('success')
+
+        if user and not failed:
+            save_history(
+                user_id=user.id,
+                prompt=prompt,
+                responses={name: result.get('response') for name, result in results.items()},
+                mode=mode
+            )
+
+        yield sse_event('done', {})
+    except Exception as e:
+        logger.exception('Compare stream error')
+        yield sse_event('error', {
+            'error': 'Failed to stream AI responses',
+            'details': str(e)
+        })
+    finally:
+        # stop the provider streams if the client went away
+        cancelled.set()
@@ -1,18 +1,28 @@
 """
 API URL Configuration - RESTful Design
 """
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# under ASGI the AI endpoints are served by their async implementations
+if settings.AI_ASYNC_VIEWS:
+    from . import async_views as ai_views
+else:
+    ai_views = views
+
 urlpatterns = [
     # Health check
     path('health', views.health_check, name='health'),
+    path('metrics', views.metrics_view, name='metrics'),
     
     # AI endpoints - Resource-based
-    path('ai/groq', views.groq_view, name='groq'),
-    path('ai/gemini', views.gemini_view, name='gemini'),
-    path('ai/compare', views.compare_view, name='compare'),
-    path('ai/compare-with-rubric', views.compare_with_rubric_view, name='compare_with_rubric'),
+    path('ai/groq', ai_views.groq_view, name='groq'),
+    path('ai/gemini', ai_views.gemini_view, name='gemini'),
+    path('ai/compare', ai_views.compare_view, name='compare'),
+    path('ai/compare/stream', views.compare_stream_view, name='compare_stream'),
+    path('ai/compare/batch', views.compare_batch_view, name='compare_batch'),
+    path('ai/compare-with-rubric', ai_views.compare_with_rubric_view, name='compare_with_rubric'),
     
     # Authentication endpoints
     path('auth/register', views.register_view, name='register'),
@@ -21,6 +31,9 @@ urlpatterns = [
     
     # User resources - RESTful endpoints
     path('users/queries', views.history_view, name='user_queries'),  # GET - List user's queries
+    path('users/queries/search', views.search_view, name='user_queries_search'),  # GET - Full-text search
+    path('users/queries/export', views.export_view, name='user_queries_export'),  # GET - NDJSON/CSV download
+    path('users/queries/<int:query_id>/evaluate', ai_views.evaluate_history_view, name='user_query_evaluate'),  # POST - Rubric on stored responses
     path('users/profile', views.profile_view, name='user_profile'),  # GET/PUT/DELETE - CRUD on profile
 ]
 
@@ -2,102 +2,119 @@
 API Views for AI Comparator
 """
 import json
-from datetime import datetime
-from django.http import JsonResponse
+from functools import partial
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
-from groq import Groq
-import google.generativeai as genai
 from .models import QueryHistory
+from .auth import get_authenticated_user, issue_tokens, forget_user
+from .history import save_history
+from .ratelimit import check_rate_limit, rubric_budget
+from .pagination import keyset_page, parse_offset, parse_page_size
+from .export import EXPORT_FORMATS, CONTENT_TYPES, async_chunks, export_stream, history_rows, parse_timestamp
+from .search import SearchUnavailable, highlight, highlighter, search_history, search_terms
+from .metrics import render_metrics, cache_stats
+from .deadline import request_deadline
+from .fanout import fan_out
+from .providers import get_response, selected_providers
+from .resilience import provider_health
+from .rubric import get_ai_comparison_rubric, rubric_mode, skipped_rubric, RUBRIC_PROVIDERS
+from .streaming import compare_event_stream
+from .batch import compare_batch_stream, parse_batch_items
 
 User = get_user_model()
 
 
-def get_authenticated_user(request):
-    """Helper function to get authenticated user from JWT token"""
-    try:
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            return None
-        
-        token = auth_header.split(' ')[1]
-        from rest_framework_simplejwt.tokens import AccessToken
-        access_token = AccessToken(token)
-        user_id = access_token['user_id']
-        return User.objects.get(id=user_id)
-    except Exception:
-        return None
+def use_cache_for(data):
+    """Clients can send `"cache": false` to skip cached provider responses"""
+    return data.get('cache', True) is not False
 
 
-def get_groq_response(prompt):
-    """Get response from Groq API"""
-    if not settings.GROQ_API_KEY:
-        return {
-            'model': 'Groq',
-            'response': 'API key not configured',
-            'error': 'Please configure GROQ_API_KEY in .env file'
-        }
-    
-    try:
-        client = Groq(api_key=settings.GROQ_API_KEY)
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000,
-        )
-        return {
-            'model': 'Groq',
-            'response': completion.choices[0].message.content,
-            'timestamp': datetime.now().isoformat(),
-        }
-    except Exception as e:
-        print(f'Groq error: {str(e)}')
-        return {
-            'model': 'Groq',
-            'error': str(e),
-            'response': 'Failed to get response from Groq',
-        }
+def set_cache_header(response, results):
+    """Report per-provider cache hits, e.g. `X-Cache: groq=HIT, gemini=MISS`"""
+    response['X-Cache'] = ', '.join(
+        f"{name}={'HIT' if result.get('cached') else 'MISS'}"
+        for name, result in results.items()
+    )
+    return response
 
 
-def get_gemini_response(prompt):
-    """Get response from Gemini API"""
-    if not settings.GEMINI_API_KEY:
-        return {
-            'model': 'Gemini',
-            'response': 'API key not configured',
-            'error': 'Please configure GEMINI_API_KEY in .env file'
-        }
-    
-    try:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-flash-latest')
-        result = model.generate_content(prompt)
-        return {
-            'model': 'Gemini',
-            'response': result.text,
-            'timestamp': datetime.now().isoformat(),
-        }
-    except Exception as e:
-        print(f'Gemini error: {str(e)}')
-        return {
-            'model': 'Gemini',
-            'error': str(e),
-            'response': 'Failed to get response from Gemini',
-        }
+def serialize_history(q):
+    return {
+        'id': q.id,
+        'prompt': q.prompt,
+        'mode': q.mode,
+        'created_at': q.created_at.isoformat(),
+        'responses': q.response_texts(),
+    }
+
+
+def filter_modes(queries, value):
+    """Rows whose mode is one of the comma-separated modes in `value`"""
+    modes = [mode for mode in (value or '').split(',') if mode]
+    if len(modes) == 1:
+        return queries.filter(mode=modes[0])
+    if modes:
+        return queries.filter(mode__in=modes)
+    return queries
+
+
+def compare_mode(names):
+    """
+    History mode of a compare of providers `names`: 'both' for the Groq /
+    Gemini pair, the provider's name when there is one, else 'compare'
+    """
+    if sorted(names) == ['gemini', 'groq']:
+        return 'both'
+    max_length = QueryHistory._meta.get_field('mode').max_length
+    if len(names) == 1 and len(names[0]) <= max_length:
+        return names[0]
+    return 'compare'
+
+
+def history_responses(results):
+    """{provider: text} to store in history from fan-out results"""
+    return {name: result.get('response') for name, result in results.items()}
+
+
+def error_status(*results):
+    """
+    503 when every failed call was refused by an open breaker or the
+    concurrency limit, 504 when they all ran out of time, else 500
+    """
+    if all(result.get('unavailable') for result in results):
+        return 503
+    return 504 if all(result.get('timed_out') for result in results) else 500
+
+
+def set_retry_after(response, *results):
+    """Retry-After on a 503: the longest wait until a refused provider takes calls again"""
+    if response.status_code == 503:
+        response['Retry-After'] = str(max(result.get('retry_after', 1) for result in results))
+    return response
 
 
 # API Endpoints
 @require_http_methods(["GET"])
 def health_check(request):
-    """Health check endpoint"""
+    """Health check endpoint; `degraded` while a provider's circuit breaker is not closed"""
+    providers = provider_health(settings.AI_PROVIDERS)
+    degraded = any(provider['state'] != 'closed' for provider in providers.values())
     return JsonResponse({
-        'status': 'ok',
-        'message': 'AI Comparator API is running'
+        'status': 'degraded' if degraded else 'ok',
+        'message': 'AI Comparator API is running',
+        'providers': providers,
+        'rubric_store': cache_stats('rubric'),
     })
 
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus metrics for this worker process"""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # for testing purposes and separate endpoints for each model
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -110,20 +127,24 @@ def groq_view(request):
         if not prompt:
             return JsonResponse({'error': 'Prompt is required'}, status=400)
         
-        result = get_groq_response(prompt)
+        user = get_authenticated_user(request)
+        limited = check_rate_limit(request, user, 'compare')
+        if limited:
+            return limited
+        
+        result = get_response('groq', prompt, use_cache=use_cache_for(data), deadline=request_deadline(data))
         
         # Save to history if user is authenticated
-        user = get_authenticated_user(request)
         if user and not result.get('error'):
-            QueryHistory.objects.create(
-                user=user,
+            save_history(
+                user_id=user.id,
                 prompt=prompt,
-                response_groq=result.get('response'),
+                responses={'groq': result.get('response')},
                 mode='groq'
             )
         
-        status = 500 if result.get('error') else 200
-        return JsonResponse(result, status=status)
+        status = error_status(result) if result.get('error') else 200
+        return set_retry_after(set_cache_header(JsonResponse(result, status=status), {'groq': result}), result)
         
     except Exception as e:
         return JsonResponse({
@@ -143,20 +164,24 @@ def gemini_view(request):
         if not prompt:
             return JsonResponse({'error': 'Prompt is required'}, status=400)
         
-        result = get_gemini_response(prompt)
+        user = get_authenticated_user(request)
+        limited = check_rate_limit(request, user, 'compare')
+        if limited:
+            return limited
+        
+        result = get_response('gemini', prompt, use_cache=use_cache_for(data), deadline=request_deadline(data))
         
         # Save to history if user is authenticated
-        user = get_authenticated_user(request)
         if user and not result.get('error'):
-            QueryHistory.objects.create(
-                user=user,
+            save_history(
+                user_id=user.id,
                 prompt=prompt,
-                response_gemini=result.get('response'),
+                responses={'gemini': result.get('response')},
                 mode='gemini'
             )
         
-        status = 500 if result.get('error') else 200
-        return JsonResponse(result, status=status)
+        status = error_status(result) if result.get('error') else 200
+        return set_retry_after(set_cache_header(JsonResponse(result, status=status), {'gemini': result}), result)
         
     except Exception as e:
         return JsonResponse({
@@ -168,7 +193,7 @@ def gemini_view(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def compare_view(request):
-    """Compare endpoint - gets responses from all AIs"""
+    """Compare endpoint - gets responses from the selected AIs (`providers`, default AI_DEFAULT_PROVIDERS)"""
     try:
         data = json.loads(request.body)
         prompt = data.get('prompt')
@@ -176,24 +201,37 @@ def compare_view(request):
         if not prompt:
             return JsonResponse({'error': 'Prompt is required'}, status=400)
         
-        # Get responses from all models
-        results = {
-            'groq': get_groq_response(prompt),
-            'gemini': get_gemini_response(prompt),
-        }
+        try:
+            names = selected_providers(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        # Save to history if user is authenticated
         user = get_authenticated_user(request)
-        if user and not results['groq'].get('error') and not results['gemini'].get('error'):
-            QueryHistory.objects.create(
-                user=user,
+        limited = check_rate_limit(request, user, 'compare')
+        if limited:
+            return limited
+        
+        # Get responses from all models in parallel
+        use_cache = use_cache_for(data)
+        deadline = request_deadline(data)
+        results = fan_out({
+            name: partial(get_response, name, prompt, use_cache, deadline) for name in names
+        }, deadline)
+        
+        # Save to history if user is authenticated; the id lets the client
+        # evaluate these responses later (users/queries/<id>/evaluate)
+        history_id = None
+        if user and not any(result.get('error') for result in results.values()):
+            entry = save_history(
+                user_id=user.id,
                 prompt=prompt,
-                response_groq=results['groq'].get('response'),
-                response_gemini=results['gemini'].get('response'),
-                mode='both'
+                responses=history_responses(results),
+                mode=compare_mode(names),
+                write_behind=False,
             )
+            history_id = entry.id
         
-        return JsonResponse(results)
+        return set_cache_header(JsonResponse({**results, 'history_id': history_id}), results)
         
     except Exception as e:
         print(f'Compare error: {str(e)}')
@@ -203,97 +241,97 @@ def compare_view(request):
         }, status=500)
 
 
-def get_ai_comparison_rubric(prompt, groq_response, gemini_response):
-    comparison_prompt = f"""You are an expert AI evaluator. Compare these two AI responses to the same prompt and provide a detailed evaluation.
-
-Original Prompt: {prompt}
-
-Response A (Groq/Llama 3.3): {groq_response}
-
-Response B (Gemini): {gemini_response}
-
-Please evaluate both responses using the following rubric (score each criterion from 1-10):
-
-1. **Accuracy**: How factually correct and reliable is the information?
-2. **Relevance**: How well does it address the prompt?
-3. **Clarity**: How clear and easy to understand is the response?
-4. **Completeness**: How thorough and comprehensive is the answer?
-5. **Usefulness**: How practical and helpful is the response?
-
-Provide your evaluation in the following JSON format:
-{{
-    "response_a": {{
-        "accuracy": <score>,
-        "relevance": <score>,
-        "clarity": <score>,
-        "completeness": <score>,
-        "usefulness": <score>,
-        "total": <sum of all scores>,
-        "strengths": ["strength 1", "strength 2"],
-        "weaknesses": ["weakness 1", "weakness 2"]
-    }},
-    "response_b": {{
-        "accuracy": <score>,
-        "relevance": <score>,
-        "clarity": <score>,
-        "completeness": <score>,
-        "usefulness": <score>,
-        "total": <sum of all scores>,
-        "strengths": ["strength 1", "strength 2"],
-        "weaknesses": ["weakness 1", "weakness 2"]
-    }},
-    "overall_comparison": "Brief summary of which is better and why",
-    "recommendation": "Which response would you recommend and why?"
-}}"""
-
+@csrf_exempt
+@require_http_methods(["POST"])
+def compare_stream_view(request):
+    """Compare endpoint streamed as Server-Sent Events, with an optional rubric at the end"""
     try:
-        # use Gemini for comparison and parse JSON
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-flash-latest')
-        result = model.generate_content(comparison_prompt)
-
-        response_text = result.text
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].split("```")[0].strip()
-        
-        rubric = json.loads(response_text)
-        return {
-            'success': True,
-            'rubric': rubric,
-            'evaluator': 'Gemini Flash'
-        }
+        data = json.loads(request.body)
+        prompt = data.get('prompt')
+        
+        if not prompt:
+            return JsonResponse({'error': 'Prompt is required'}, status=400)
+
+        try:
+            mode = rubric_mode(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        user = get_authenticated_user(request)
+        with_rubric = data.get('rubric', True) is not False
+        limited = check_rate_limit(request, user, rubric_budget(mode, with_rubric))
+        if limited:
+            return limited
+        
+        stream = compare_event_stream(
+            prompt,
+            user=user,
+            use_cache=use_cache_for(data),
+            with_rubric=with_rubric,
+            rubric_mode=mode,
+            deadline=request_deadline(data),
+        )
+        if settings.AI_ASYNC_VIEWS:
+            # under ASGI a sync generator would be read to the end before sending
+            stream = async_chunks(stream)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+        
     except Exception as e:
-        print(f'Rubric generation error: {str(e)}')
-        # fallback: try with Groq
+        print(f'Compare stream error: {str(e)}')
+        return JsonResponse({
+            'error': 'Failed to stream AI responses',
+            'details': str(e)
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def compare_batch_view(request):
+    """Batch compare endpoint - runs many prompts and streams results as NDJSON"""
+    try:
+        data = json.loads(request.body)
+        
         try:
-            client = Groq(api_key=settings.GROQ_API_KEY)
-            completion = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "user", "content": comparison_prompt}],
-                max_tokens=2000,
-            )
-            response_text = completion.choices[0].message.content
-            
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            rubric = json.loads(response_text)
-            return {
-                'success': True,
-                'rubric': rubric,
-                'evaluator': 'Groq Llama 3.3'
-            }
-        except Exception as e2:
-            print(f'Fallback rubric error: {str(e2)}')
-            return {
-                'success': False,
-                'error': 'Failed to generate comparison rubric',
-                'details': str(e2)
-            }
+            prompts = parse_batch_items(data)
+            mode = rubric_mode(data)
+        except (ValueError, AttributeError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        if not prompts:
+            return JsonResponse({'error': 'Prompts are required'}, status=400)
+        
+        if len(prompts) > settings.AI_BATCH_MAX_PROMPTS:
+            return JsonResponse({
+                'error': f'At most {settings.AI_BATCH_MAX_PROMPTS} prompts per batch'
+            }, status=400)
+        
+        user = get_authenticated_user(request)
+        with_rubric = data.get('rubric', True) is not False
+        limited = check_rate_limit(request, user, rubric_budget(mode, with_rubric), prompts=len(prompts))
+        if limited:
+            return limited
+        
+        stream = compare_batch_stream(
+            prompts,
+            user=user,
+            use_cache=use_cache_for(data),
+            with_rubric=with_rubric,
+            rubric_mode=mode,
+        )
+        if settings.AI_ASYNC_VIEWS:
+            # send each line as it is written, not once the whole batch is done
+            stream = async_chunks(stream)
+        return StreamingHttpResponse(stream, content_type='application/x-ndjson')
+        
+    except Exception as e:
+        print(f'Batch compare error: {str(e)}')
+        return JsonResponse({
+            'error': 'Failed to run batch comparison',
+            'details': str(e)
+        }, status=500)
 
 
 @csrf_exempt
@@ -305,24 +343,46 @@ def compare_with_rubric_view(request):
         
         if not prompt:
             return JsonResponse({'error': 'Prompt is required'}, status=400)
+
+        try:
+            mode = rubric_mode(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        # get responses from both models
-        groq_result = get_groq_response(prompt)
-        gemini_result = get_gemini_response(prompt)
-        
-        if groq_result.get('error') or gemini_result.get('error'):
-            return JsonResponse({
-                'error': 'Failed to get responses from one or both AI models',
+        user = get_authenticated_user(request)
+        limited = check_rate_limit(request, user, rubric_budget(mode))
+        if limited:
+            return limited
+        
+        # get responses from both models in parallel
+        use_cache = use_cache_for(data)
+        deadline = request_deadline(data)
+        provider_deadline = deadline.split(settings.AI_DEADLINE_BUDGETS['providers'])
+        results = fan_out({
+            name: partial(get_response, name, prompt, use_cache, provider_deadline) for name in RUBRIC_PROVIDERS
+        }, provider_deadline)
+        groq_result = results['groq']
+        gemini_result = results['gemini']
+        
+        if groq_result.get('error') and gemini_result.get('error'):
+            return set_retry_after(JsonResponse({
+                'error': 'Failed to get responses from both AI models',
                 'groq': groq_result,
                 'gemini': gemini_result
-            }, status=500)
+            }, status=error_status(groq_result, gemini_result)), groq_result, gemini_result)
         
         # get AI-based comparison and rubric
-        rubric_result = get_ai_comparison_rubric(
-            prompt,
-            groq_result.get('response'),
-            gemini_result.get('response')
-        )
+        if groq_result.get('error') or gemini_result.get('error'):
+            # one model failed or ran out of time: return what we have
+            rubric_result = skipped_rubric()
+        else:
+            rubric_result = get_ai_comparison_rubric(
+                prompt,
+                groq_result.get('response'),
+                gemini_result.get('response'),
+                deadline,
+                mode,
+            )
         
         # prepare response and save to history
         response_data = {
@@ -331,20 +391,19 @@ def compare_with_rubric_view(request):
                 'groq': groq_result,
                 'gemini': gemini_result
             },
-            'evaluation': rubric_result
+            'evaluation': rubric_result,
+            'partial': not rubric_result.get('success'),
         }
 
-        user = get_authenticated_user(request)
         if user and rubric_result.get('success'):
-            QueryHistory.objects.create(
-                user=user,
+            save_history(
+                user_id=user.id,
                 prompt=prompt,
-                response_groq=groq_result.get('response'),
-                response_gemini=gemini_result.get('response'),
+                responses=history_responses(results),
                 mode='compare_with_rubric'
             )
         
-        return JsonResponse(response_data)
+        return set_cache_header(JsonResponse(response_data), results)
         
     except Exception as e:
         print(f'Compare with rubric error: {str(e)}')
@@ -388,7 +447,6 @@ def register_view(request):
             password=password,
             username=username
         )
-        refresh = RefreshToken.for_user(user)
         
         return JsonResponse({
             'message': 'User registered successfully',
@@ -397,10 +455,7 @@ def register_view(request):
                 'email': user.email,
                 'username': user.username,
             },
-            'tokens': {
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-            }
+            'tokens': issue_tokens(user)
         }, status=201)
         
     except Exception as e:
@@ -440,8 +495,6 @@ def login_view(request):
                 'error': 'Invalid email or password'
             }, status=401)
         
-        # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
         
         return JsonResponse({
             'message': 'Login successful',
@@ -450,10 +503,7 @@ def login_view(request):
                 'email': user.email,
                 'username': user.username,
             },
-            'tokens': {
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-            }
+            'tokens': issue_tokens(user)
         })
         
     except Exception as e:
@@ -491,7 +541,12 @@ def get_user_view(request):
 
 @require_http_methods(["GET"])
 def history_view(request):
-    """Get user's query history (last 5 queries)"""
+    """
+    Get user's query history, newest first.
+
+    Query params: `limit` (page size), `mode` (one or more comma-separated
+    modes) and `cursor` (the `next_cursor` of the previous page).
+    """
     try:
         user = get_authenticated_user(request)
         if not user:
@@ -499,21 +554,18 @@ def history_view(request):
                 'error': 'Authentication required'
             }, status=401)
         
-        # Get last 5 queries for the user
-        queries = QueryHistory.objects.filter(user=user)[:5]
+        queries = filter_modes(QueryHistory.objects.filter(user_id=user.id).with_responses(), request.GET.get('mode'))
         
-        history = [{
-            'id': q.id,
-            'prompt': q.prompt,
-            'mode': q.mode,
-            'created_at': q.created_at.isoformat(),
-            'responses': {
-                'groq': q.response_groq,
-                'gemini': q.response_gemini,
-            }
-        } for q in queries]
+        try:
+            page_size = parse_page_size(request.GET.get('limit'))
+            rows, next_cursor = keyset_page(queries, page_size, request.GET.get('cursor'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        return JsonResponse({'history': history})
+        return JsonResponse({
+            'history': [serialize_history(q) for q in rows],
+            'next_cursor': next_cursor,
+        })
         
     except Exception as e:
         print(f'History error: {str(e)}')
@@ -523,6 +575,184 @@ def history_view(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+def export_view(request):
+    """
+    Stream the user's whole query history, newest first, as a download.
+
+    Query params: `format` (ndjson or csv), `since` and `until` (ISO dates
+    or datetimes; `until` is exclusive, but a bare date includes that day),
+    `mode` (one or more comma-separated modes) and `compress=gzip`.
+    """
+    try:
+        user = get_authenticated_user(request)
+        if not user:
+            return JsonResponse({
+                'error': 'Authentication required'
+            }, status=401)
+        
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+        compress = request.GET.get('compress', '')
+        if compress not in ('', 'gzip'):
+            return JsonResponse({'error': 'compress must be gzip'}, status=400)
+        
+        queries = filter_modes(QueryHistory.objects.filter(user_id=user.id).with_responses(), request.GET.get('mode'))
+        try:
+            if request.GET.get('since'):
+                queries = queries.filter(created_at__gte=parse_timestamp(request.GET['since'], 'since'))
+            if request.GET.get('until'):
+                queries = queries.filter(created_at__lt=parse_timestamp(request.GET['until'], 'until', end=True))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        rows = history_rows(queries, settings.HISTORY_EXPORT_CHUNK_SIZE)
+        chunks = export_stream(rows, export_format, serialize_history, compress=bool(compress))
+        if settings.AI_ASYNC_VIEWS:
+            chunks = async_chunks(chunks)
+        
+        filename = f'history.{export_format}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            chunks, content_type='application/gzip' if compress else CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+        
+    except Exception as e:
+        print(f'Export error: {str(e)}')
+        return JsonResponse({
+            'error': 'Failed to export history',
+            'details': str(e)
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def search_view(request):
+    """
+    Full-text search over the user's query history, best match first.
+
+    Query params: `q` (all words must match), `limit` (page size) and
+    `cursor` (the `next_cursor` of the previous page).
+    """
+    try:
+        user = get_authenticated_user(request)
+        if not user:
+            return JsonResponse({
+                'error': 'Authentication required'
+            }, status=401)
+        
+        query = request.GET.get('q', '')
+        terms = search_terms(query)
+        if not terms:
+            return JsonResponse({'error': 'Search query is required'}, status=400)
+        
+        try:
+            page_size = parse_page_size(request.GET.get('limit'))
+            offset = parse_offset(request.GET.get('cursor'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        hits = search_history(user.id, query, page_size + 1, offset)
+        next_cursor = str(offset + page_size) if len(hits) > page_size else None
+        hits = hits[:page_size]
+        rows = QueryHistory.objects.with_responses().in_bulk([row_id for row_id, _ in hits])
+        
+        pattern = highlighter(terms)
+        results = []
+        for row_id, score in hits:
+            q = rows[row_id]
+            result = serialize_history(q)
+            result['score'] = score
+            fields = [('prompt', q.prompt), *result['responses'].items()]
+            result['highlights'] = {
+                field: snippet for field, snippet in (
+                    (field, highlight(text, pattern)) for field, text in fields
+                ) if snippet
+            }
+            results.append(result)
+        
+        return JsonResponse({
+            'results': results,
+            'next_cursor': next_cursor,
+        })
+        
+    except SearchUnavailable as e:
+        return JsonResponse({'error': str(e)}, status=501)
+    except Exception as e:
+        print(f'Search error: {str(e)}')
+        return JsonResponse({
+            'error': 'Failed to search history',
+            'details': str(e)
+        }, status=500)
+
+
+def stored_rubric_inputs(q):
+    """(groq, gemini) responses of a history entry, or None if one is missing"""
+    responses = q.response_texts()
+    if not all(responses.get(name) for name in RUBRIC_PROVIDERS):
+        return None
+    return tuple(responses[name] for name in RUBRIC_PROVIDERS)
+
+
+def evaluation_response(q, rubric_result):
+    """Rubric of a stored entry, as returned by the evaluate endpoints"""
+    status = error_status(rubric_result) if not rubric_result.get('success') else 200
+    return set_retry_after(JsonResponse({
+        'history_id': q.id,
+        'prompt': q.prompt,
+        'evaluation': rubric_result,
+    }, status=status), rubric_result)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def evaluate_history_view(request, query_id):
+    """
+    Run the rubric on the responses stored with a history entry, so the
+    client can evaluate a compare result without asking both models again.
+    Accepts the same `mode` and `deadline_ms` as compare-with-rubric. The
+    entry itself is left as it was.
+    """
+    try:
+        user = get_authenticated_user(request)
+        if not user:
+            return JsonResponse({
+                'error': 'Authentication required'
+            }, status=401)
+        
+        data = json.loads(request.body or b'{}')
+        try:
+            mode = rubric_mode(data)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        q = QueryHistory.objects.filter(id=query_id, user_id=user.id).with_responses().first()
+        if q is None:
+            return JsonResponse({'error': 'Query not found'}, status=404)
+        
+        responses = stored_rubric_inputs(q)
+        if responses is None:
+            return JsonResponse({
+                'error': 'Query needs stored responses from both models to be evaluated'
+            }, status=400)
+        
+        limited = check_rate_limit(request, user, rubric_budget(mode))
+        if limited:
+            return limited
+        
+        # the entry keeps its mode; judged rubrics live in the rubric store
+        rubric_result = get_ai_comparison_rubric(q.prompt, *responses, request_deadline(data), mode)
+        return evaluation_response(q, rubric_result)
+        
+    except Exception as e:
+        print(f'Evaluate error: {str(e)}')
+        return JsonResponse({
+            'error': 'Failed to evaluate query',
+            'details': str(e)
+        }, status=500)
+
+
 @csrf_exempt
 def profile_view(request):
     """
@@ -532,12 +762,15 @@ def profile_view(request):
     DELETE - Delete profile/account
     """
     try:
-        user = get_authenticated_user(request)
-        if not user:
+        auth_user = get_authenticated_user(request)
+        if not auth_user:
             return JsonResponse({
                 'error': 'Authentication required'
             }, status=401)
         
+        # profile fields are not in the token, load the full row
+        user = auth_user.get_user()
+        
         if request.method == 'GET':
             # Read profile
             return JsonResponse({
@@ -591,6 +824,7 @@ def profile_view(request):
             # Delete account
             user_email = user.email
             user.delete()
+            forget_user(auth_user.id)
             
             return JsonResponse({
                 'message': 'Account deleted successfully',
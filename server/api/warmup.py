@@ -0,0 +1,38 @@
+"""
+Optional warm-up of a worker process (AI_WARMUP=true)
+
+Provider SDKs and numpy are imported on first use, so manage.py commands
+and worker boots don't pay for them, but the first request of each worker
+does. With AI_WARMUP on, config/wsgi.py and config/asgi.py call warm_up()
+when the worker loads the application: it imports the local rubric and
+builds the client of every configured provider that has an API key, which
+loads its SDK.
+
+Clients must not be built before the server forks: the Gemini SDK's gRPC
+channel does not survive a fork. Don't combine AI_WARMUP with gunicorn's
+--preload, which loads the application in the master process.
+"""
+import logging
+import time
+from django.conf import settings
+from .providers import clients, missing_key_result
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Load what the first request would; returns the seconds it took"""
+    start = time.perf_counter()
+    try:
+        from . import fast_rubric  # noqa: F401 (loads numpy)
+    except Exception as e:
+        logger.warning('Warm-up error for fast_rubric: %s', e)
+    for name in settings.AI_PROVIDERS:
+        if missing_key_result(name):
+            continue
+        try:
+            clients.get(name)
+        except Exception as e:
+            logger.warning('Warm-up error for %s: %s', name, e)
+    return time.perf_counter() - start
+
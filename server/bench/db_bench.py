@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+History read/write throughput on SQLite, before and after connection tuning.
+
+Each profile runs in its own process against a fresh database file:
+
+- baseline: rollback journal, synchronous=FULL, no mmap and a new
+  connection per request (the settings before get_database_config tuned
+  them);
+- tuned: the defaults of config/database_config.py (WAL,
+  synchronous=NORMAL, busy_timeout, mmap and persistent connections).
+
+Writer threads insert history rows with their responses (save_history,
+synchronously) while reader threads fetch the first history page with its
+responses, as /api/users/queries does. Connections are released between
+operations the way Django does between requests. Example:
+
+    python bench/db_bench.py --writers 4 --readers 4 --seconds 10 --output db_bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from load_test import percentile
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+
+PROFILES = {
+    'baseline': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_MMAP_SIZE': '0',
+        'DB_CONN_MAX_AGE': '0',
+    },
+    'tuned': {},
+}
+
+RESPONSE_TEXT = 'The answer walks through the question step by step with examples and caveats. ' * 20
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'operations': len(latencies),
+        'errors': errors,
+        'throughput_ops': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2) if latencies else None,
+            'p95': round(percentile(latencies, 0.95), 2) if latencies else None,
+            'p99': round(percentile(latencies, 0.99), 2) if latencies else None,
+        },
+    }
+
+
+def run_profile(args):
+    """Body of the per-profile process; prints its results as JSON"""
+    sys.path.insert(0, str(SERVER_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import close_old_connections, connections
+    from api.history import history_entry, save_history, save_history_batch
+    from api.models import QueryHistory, User
+    from api.pagination import keyset_page
+
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user(email='bench@example.com', password='bench-password', username='bench')
+
+    def responses():
+        tag = uuid.uuid4().hex
+        return {'groq': f'{tag} {RESPONSE_TEXT}', 'gemini': f'{RESPONSE_TEXT} {tag}'}
+
+    for start in range(0, args.seed_rows, 500):
+        save_history_batch([
+            history_entry(responses(), user_id=user.id, prompt=f'seed prompt {index}', mode='both')
+            for index in range(start, min(start + 500, args.seed_rows))
+        ])
+    connections.close_all()
+
+    results = {'write': ([], [0]), 'read': ([], [0])}
+    deadline = time.perf_counter() + args.seconds
+
+    def write():
+        save_history(
+            responses=responses(), write_behind=False,
+            user_id=user.id, prompt=f'bench prompt {uuid.uuid4().hex}', mode='both',
+        )
+
+    def read():
+        queries = QueryHistory.objects.filter(user_id=user.id).with_responses()
+        rows, _ = keyset_page(queries, args.page_size)
+        for row in rows:
+            row.response_texts()
+
+    def worker(kind, operation):
+        latencies, errors = results[kind]
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                operation()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception as e:
+                errors[0] += 1
+                if errors[0] == 1:
+                    print(f'{kind} error: {str(e)}', file=sys.stderr)
+            # what request_finished does at the end of each request
+            close_old_connections()
+        connections.close_all()
+
+    threads = [threading.Thread(target=worker, args=('write', write)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=worker, args=('read', read)) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        kind: summarize(latencies, errors[0], elapsed) for kind, (latencies, errors) in results.items()
+    }))
+
+
+def run(args):
+    results = {}
+    for name in args.profiles:
+        print(f'{name}: {args.writers} writers, {args.readers} readers for {args.seconds}s...')
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                **os.environ,
+                **PROFILES[name],
+                'DB_TYPE': 'sqlite',
+                'SQLITE_PATH': os.path.join(directory, 'bench.sqlite3'),
+                'HISTORY_WRITE_BEHIND': 'false',
+            }
+            command = [sys.executable, __file__, '--profile-process', *sys.argv[1:]]
+            output = subprocess.run(command, env=env, cwd=SERVER_DIR, capture_output=True, text=True, check=True)
+        results[name] = json.loads(output.stdout.strip().splitlines()[-1])
+        for kind, result in results[name].items():
+            latency = result['latency_ms']
+            print(f"  {kind}: {result['throughput_ops']} ops/s, p50 {latency['p50']} ms, "
+                  f"p95 {latency['p95']} ms, {result['errors']} errors")
+    return results
+
+
+def print_comparison(results):
+    if not {'baseline', 'tuned'} <= set(results):
+        return
+    print('\nTuned vs baseline:')
+    for kind in ('write', 'read'):
+        old, new = results['baseline'][kind], results['tuned'][kind]
+        if old['throughput_ops'] and new['throughput_ops']:
+            print(f"  {kind}: {new['throughput_ops'] / old['throughput_ops']:.2f}x throughput, "
+                  f"p95 {old['latency_ms']['p95']} -> {new['latency_ms']['p95']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite history read/write benchmark')
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--seed-rows', type=int, default=2000, help='history rows inserted before timing')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--label', default='', help='free-form label stored in the report, e.g. a git sha')
+    parser.add_argument('--output', default='db_bench.json')
+    parser.add_argument('--profile-process', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile_process:
+        run_profile(args)
+        return
+
+    results = run(args)
+    report = {
+        'meta': {
+            'label': args.label,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'writers': args.writers,
+            'readers': args.readers,
+            'seconds': args.seconds,
+            'seed_rows': args.seed_rows,
+            'python': platform.python_version(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f'\nWrote {args.output}')
+    print_comparison(results)
+
+
+if __name__ == '__main__':
+    main()
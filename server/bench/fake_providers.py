@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+"""
+Local stand-in for the Groq and Gemini APIs, for load tests without quota.
+
+Speaks the OpenAI-compatible chat completions format used by the Groq SDK
+and the Gemini REST format used by google-generativeai, both plain and
+streamed. Point the server at it with:
+
+    GROQ_BASE_URL=http://127.0.0.1:8090
+    GEMINI_BASE_URL=http://127.0.0.1:8090
+
+Behaviour is set with flags, or per provider with a JSON profile:
+
+    {"default": {"latency_ms": 300}, "gemini": {"token_rate": 80, "error_rate": 0.02}}
+
+Judge prompts (the rubric) get a valid rubric JSON back so the whole
+compare-with-rubric pipeline runs.
+"""
+import argparse
+import json
+import random
+import re
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+DEFAULT_BEHAVIOUR = {
+    'latency_ms': 200,       # time to first token
+    'jitter_ms': 50,         # random extra latency, 0..jitter_ms
+    'token_rate': 0,         # tokens per second after the first one, 0 = instant
+    'response_tokens': 200,  # size of every answer
+    'error_rate': 0.0,       # fraction of requests that fail
+    'error_status': 500,     # status code for failed requests (e.g. 429)
+}
+
+WORDS = (
+    'the model considers the question carefully and answers with a clear '
+    'structured explanation covering the main points examples and caveats'
+).split()
+
+GEMINI_PATH = re.compile(r'^/v1(?:beta)?/models/(?P<model>[^:]+):(?P<method>generateContent|streamGenerateContent)$')
+
+
+def rubric_json():
+    def scores():
+        values = {key: random.randint(5, 10) for key in ('accuracy', 'relevance', 'clarity', 'completeness', 'usefulness')}
+        values['total'] = sum(values.values())
+        values['strengths'] = ['Clear', 'Relevant']
+        values['weaknesses'] = ['Could be shorter']
+        return values
+
+    return json.dumps({
+        'response_a': scores(),
+        'response_b': scores(),
+        'overall_comparison': 'Both responses are comparable.',
+        'recommendation': 'Either response is acceptable.',
+    })
+
+
+def answer_tokens(prompt, count):
+    if 'expert AI evaluator' in prompt:
+        return [rubric_json()]
+    return [WORDS[i % len(WORDS)] + ' ' for i in range(count)]
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    profile = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def behaviour(self, provider):
+        merged = dict(DEFAULT_BEHAVIOUR)
+        merged.update(self.profile.get('default', {}))
+        merged.update(self.profile.get(provider, {}))
+        return merged
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def write_chunk(self, data):
+        data = data.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def wait_first_token(self, behaviour):
+        time.sleep((behaviour['latency_ms'] + random.uniform(0, behaviour['jitter_ms'])) / 1000)
+
+    def wait_next_token(self, behaviour):
+        if behaviour['token_rate'] > 0:
+            time.sleep(1 / behaviour['token_rate'])
+
+    def fail_randomly(self, behaviour):
+        if random.random() < behaviour['error_rate']:
+            self.wait_first_token(behaviour)
+            self.send_json(behaviour['error_status'], {
+                'error': {'message': 'Injected failure', 'code': behaviour['error_status']},
+            })
+            return True
+        return False
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        if path in ('/openai/v1/chat/completions', '/v1/chat/completions'):
+            return self.openai_chat()
+        match = GEMINI_PATH.match(path)
+        if match:
+            return self.gemini_generate(match.group('model'), match.group('method') == 'streamGenerateContent')
+        self.send_json(404, {'error': {'message': f'Unknown path {path}'}})
+
+    # OpenAI-compatible (Groq)
+
+    def openai_chat(self):
+        behaviour = self.behaviour('groq')
+        request = self.read_json()
+        if self.fail_randomly(behaviour):
+            return
+
+        prompt = ' '.join(message.get('content') or '' for message in request.get('messages', []))
+        tokens = answer_tokens(prompt, min(behaviour['response_tokens'], request.get('max_tokens') or 10 ** 9))
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        model = request.get('model', 'fake-model')
+        usage = {
+            'prompt_tokens': len(prompt.split()),
+            'completion_tokens': len(tokens),
+            'total_tokens': len(prompt.split()) + len(tokens),
+        }
+
+        self.wait_first_token(behaviour)
+        if not request.get('stream'):
+            for _ in tokens[1:]:
+                self.wait_next_token(behaviour)
+            return self.send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                    'finish_reason': 'stop',
+                }],
+                'usage': usage,
+            })
+
+        self.start_chunked('text/event-stream')
+        for index, token in enumerate(tokens):
+            if index:
+                self.wait_next_token(behaviour)
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+            }
+            self.write_chunk(f'data: {json.dumps(chunk)}\n\n')
+        done = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+            'x_groq': {'usage': usage},
+        }
+        self.write_chunk(f'data: {json.dumps(done)}\n\n')
+        self.write_chunk('data: [DONE]\n\n')
+        self.end_chunked()
+
+    # Gemini REST
+
+    def gemini_generate(self, model, stream):
+        behaviour = self.behaviour('gemini')
+        request = self.read_json()
+        if self.fail_randomly(behaviour):
+            return
+
+        prompt = ' '.join(
+            part.get('text', '')
+            for content in request.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        tokens = answer_tokens(prompt, behaviour['response_tokens'])
+
+        def chunk(text, finished):
+            candidate = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+            if finished:
+                candidate['finishReason'] = 'STOP'
+            return {
+                'candidates': [candidate],
+                'usageMetadata': {
+                    'promptTokenCount': len(prompt.split()),
+                    'candidatesTokenCount': len(tokens),
+                    'totalTokenCount': len(prompt.split()) + len(tokens),
+                },
+                'modelVersion': model,
+            }
+
+        self.wait_first_token(behaviour)
+        if not stream:
+            for _ in tokens[1:]:
+                self.wait_next_token(behaviour)
+            return self.send_json(200, chunk(''.join(tokens), True))
+
+        sse = 'alt=sse' in self.path
+        self.start_chunked('text/event-stream' if sse else 'application/json')
+        if not sse:
+            self.write_chunk('[')
+        for index, token in enumerate(tokens):
+            if index:
+                self.wait_next_token(behaviour)
+            payload = json.dumps(chunk(token, index == len(tokens) - 1))
+            if sse:
+                self.write_chunk(f'data: {payload}\r\n\r\n')
+            else:
+                self.write_chunk(payload if index == 0 else ',' + payload)
+        if not sse:
+            self.write_chunk(']')
+        self.end_chunked()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--profile', help='JSON file with per-provider behaviour')
+    for key, value in DEFAULT_BEHAVIOUR.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=type(value), default=None)
+    args = parser.parse_args()
+
+    profile = {}
+    if args.profile:
+        with open(args.profile) as f:
+            profile = json.load(f)
+    overrides = {key: getattr(args, key) for key in DEFAULT_BEHAVIOUR if getattr(args, key) is not None}
+    profile.setdefault('default', {}).update(overrides)
+    FakeProviderHandler.profile = profile
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeProviderHandler)
+    server.daemon_threads = True
+    print(f'Fake providers listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
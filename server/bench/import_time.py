@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+"""
+Import time of a worker boot, as reported by `python -X importtime`.
+
+A fresh interpreter runs django.setup() and imports the URLconf (and with
+it every view) the way a worker does before its first request. The report
+lists the total import time and the slowest top-level imports, and which of
+the modules that should be loaded lazily (provider SDKs, gRPC, numpy) were
+imported anyway. Example:
+
+    python bench/import_time.py
+
+With --check the run is compared to a committed report instead and the
+script exits 1 if a lazy module is imported at boot or the total is more
+than --tolerance above the report's:
+
+    python bench/import_time.py --check bench/import_time.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from statistics import median
+
+BENCH_DIR = Path(__file__).resolve().parent
+SERVER_DIR = BENCH_DIR.parent
+
+BOOT = "import django; django.setup(); import config.urls"
+
+# modules that are only needed once a provider is called or a local rubric
+# is scored, see api/providers.py and api/rubric.py
+LAZY_MODULES = ['groq', 'google.generativeai', 'grpc', 'numpy']
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def measure(env):
+    """({module: (self_us, cumulative_us)}, [(top-level module, cumulative_us)]) of one boot"""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT],
+        env=env, cwd=SERVER_DIR, capture_output=True, text=True, check=True,
+    )
+    modules, top_level = {}, []
+    for line in output.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, name = match.groups()
+        modules[name] = (int(own), int(cumulative))
+        if not indent:
+            top_level.append((name, int(cumulative)))
+    return modules, top_level
+
+
+def run(args):
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'config.settings',
+        'DB_TYPE': 'sqlite',
+        'AI_WARMUP': 'false',
+        # a fresh interpreter every run, but with compiled bytecode as in production
+        'PYTHONDONTWRITEBYTECODE': '',
+    }
+    # the first run writes any missing .pyc files
+    measure(env)
+    runs = [measure(env) for _ in range(args.runs)]
+    totals = [sum(cumulative for _, cumulative in top_level) for _, top_level in runs]
+    modules, top_level = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    top_level = sorted(top_level, key=lambda item: item[1], reverse=True)
+    return {
+        'total_ms': round(median(totals) / 1000, 1),
+        'modules': len(modules),
+        'slowest': [
+            {'module': name, 'cumulative_ms': round(cumulative / 1000, 1)}
+            for name, cumulative in top_level[:args.top]
+        ],
+        'lazy_modules_imported': [name for name in LAZY_MODULES if name in modules],
+    }
+
+
+def check(result, baseline_path, tolerance):
+    """Problems of `result` against the report at `baseline_path`"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['result']
+    problems = [f'{name} is imported at boot' for name in result['lazy_modules_imported']]
+    limit = baseline['total_ms'] * (1 + tolerance)
+    if result['total_ms'] > limit:
+        problems.append(
+            f"total import time {result['total_ms']} ms is over {limit:.1f} ms "
+            f"({baseline['total_ms']} ms + {tolerance:.0%})"
+        )
+    return problems
+
+
+def print_result(result):
+    print(f"Total import time: {result['total_ms']} ms over {result['modules']} modules")
+    for item in result['slowest']:
+        print(f"  {item['cumulative_ms']:>8} ms  {item['module']}")
+    imported = ', '.join(result['lazy_modules_imported']) or 'none'
+    print(f'Lazy modules imported at boot: {imported}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker boot import time')
+    parser.add_argument('--runs', type=int, default=5, help='boots measured; the median is reported')
+    parser.add_argument('--top', type=int, default=15, help='slowest top-level imports listed')
+    parser.add_argument('--label', default='', help='free-form label stored in the report, e.g. a git sha')
+    parser.add_argument('--output', default=str(BENCH_DIR / 'import_time.json'))
+    parser.add_argument('--check', metavar='REPORT', help='compare to this report instead of writing one')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown over the report with --check')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_result(result)
+
+    if args.check:
+        problems = check(result, args.check, args.tolerance)
+        for problem in problems:
+            print(f'FAIL: {problem}')
+        sys.exit(1 if problems else 0)
+
+    report = {
+        'meta': {
+            'label': args.label,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'runs': args.runs,
+            'python': platform.python_version(),
+        },
+        'result': result,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
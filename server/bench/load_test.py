@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Fixed-concurrency load test for the AI Comparator API.
+
+Drives /api/ai/compare, /api/ai/compare-with-rubric and /api/users/queries
+and writes throughput and latency percentiles per endpoint to a JSON file
+that can be diffed between releases. Run it against a server whose
+providers point at bench/fake_providers.py to avoid spending real quota:
+
+    python bench/fake_providers.py --latency-ms 300 --token-rate 200 &
+    GROQ_API_KEY=fake GEMINI_API_KEY=fake RATE_LIMIT_ENABLED=false \\
+    GROQ_BASE_URL=http://127.0.0.1:8090 GEMINI_BASE_URL=http://127.0.0.1:8090 \\
+        python manage.py runserver 3001 &
+    python bench/load_test.py --concurrency 16 --requests 200 --output bench_results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import time
+import uuid
+from datetime import datetime, timezone
+import httpx
+
+ENDPOINTS = {
+    'compare': ('POST', '/api/ai/compare'),
+    'compare-with-rubric': ('POST', '/api/ai/compare-with-rubric'),
+    'queries': ('GET', '/api/users/queries'),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize(latencies, statuses, errors, elapsed):
+    latencies = sorted(latencies)
+    total = len(statuses)
+    return {
+        'requests': total,
+        'errors': errors,
+        'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'min': round(latencies[0], 1) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies), 1) if latencies else None,
+            'p50': round(percentile(latencies, 0.50), 1) if latencies else None,
+            'p95': round(percentile(latencies, 0.95), 1) if latencies else None,
+            'p99': round(percentile(latencies, 0.99), 1) if latencies else None,
+            'max': round(latencies[-1], 1) if latencies else None,
+        },
+    }
+
+
+async def get_token(client, email, password):
+    """Register (or log in) the benchmark user and return an access token"""
+    response = await client.post('/api/auth/register', json={
+        'email': email, 'password': password, 'username': 'bench',
+    })
+    if response.status_code != 201:
+        response = await client.post('/api/auth/login', json={'email': email, 'password': password})
+    response.raise_for_status()
+    return response.json()['tokens']['access']
+
+
+async def run_endpoint(client, name, args, headers):
+    method, path = ENDPOINTS[name]
+    run_id = uuid.uuid4().hex[:8]
+    counter = iter(range(args.requests))
+    latencies, statuses = [], []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for index in counter:
+            body = None
+            if method == 'POST':
+                # unique prompts unless we are measuring the cache
+                prompt = args.prompt if args.repeat_prompts else f'{args.prompt} [{run_id}-{index}]'
+                body = {'prompt': prompt}
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+                statuses.append(response.status_code)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                statuses.append(0)
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return summarize(latencies, statuses, errors, time.perf_counter() - start)
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        token = await get_token(client, args.email, args.password)
+        headers = {'Authorization': f'Bearer {token}'}
+        results = {}
+        for name in args.endpoints:
+            print(f'{name}: {args.requests} requests at concurrency {args.concurrency}...')
+            results[name] = await run_endpoint(client, name, args, headers)
+            latency = results[name]['latency_ms']
+            print(f"  {results[name]['throughput_rps']} req/s, p50 {latency['p50']} ms, "
+                  f"p95 {latency['p95']} ms, p99 {latency['p99']} ms, {results[name]['errors']} errors")
+        return results
+
+
+def print_comparison(results, baseline):
+    print('\nChange vs baseline:')
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        parts = []
+        for label, new_value, old_value in [
+            ('rps', result['throughput_rps'], old['throughput_rps']),
+            ('p50', result['latency_ms']['p50'], old['latency_ms']['p50']),
+            ('p95', result['latency_ms']['p95'], old['latency_ms']['p95']),
+            ('p99', result['latency_ms']['p99'], old['latency_ms']['p99']),
+        ]:
+            if new_value is not None and old_value:
+                parts.append(f'{label} {(new_value - old_value) / old_value * 100:+.1f}%')
+        print(f"  {name}: {', '.join(parts)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fixed-concurrency load test for the AI Comparator API')
+    parser.add_argument('--base-url', default='http://127.0.0.1:3001')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument('--prompt', default='Explain quantum computing in simple terms')
+    parser.add_argument('--repeat-prompts', action='store_true', help='send the same prompt every time (cache hits)')
+    parser.add_argument('--email', default='bench@example.com')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--label', default='', help='free-form label stored in the report, e.g. a git sha')
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous report to compare against')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        'meta': {
+            'label': args.label,
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'base_url': args.base_url,
+            'concurrency': args.concurrency,
+            'requests_per_endpoint': args.requests,
+            'repeat_prompts': args.repeat_prompts,
+            'python': platform.python_version(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f'\nWrote {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+"""
+ASGI config for AI Comparator project.
+
+Serves the AI endpoints with their async implementations, e.g.:
+    gunicorn config.asgi:application -k uvicorn.workers.UvicornWorker
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('AI_ASYNC_VIEWS', 'true')
+
+application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AI_WARMUP:
+    from api.warmup import warm_up
+    warm_up()
@@ -38,6 +38,14 @@ def get_database_config():
                 'PASSWORD': os.getenv('DB_PASSWORD', ''),
                 'HOST': os.getenv('DB_HOST', 'localhost'),
                 'PORT': os.getenv('DB_PORT', '5432'),
+                **connection_settings(),
+                # a transaction-pooling PgBouncer hands each transaction to any
+                # server connection, so cursors can't outlive one
+                'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DB_POOLER', '').lower() == 'pgbouncer',
+                'OPTIONS': {
+                    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5')),
+                    'application_name': os.getenv('DB_APPLICATION_NAME', 'ai-comparator'),
+                },
             }
         }
     else:
@@ -46,6 +54,46 @@ def get_database_config():
         return {
             'default': {
                 'ENGINE': 'django.db.backends.sqlite3',
-                'NAME': BASE_DIR / 'db.sqlite3',
+                'NAME': os.getenv('SQLITE_PATH') or BASE_DIR / 'db.sqlite3',
+                **connection_settings(),
+                # applied by configure_sqlite_connection when a connection opens
+                'PRAGMAS': sqlite_pragmas(),
             }
-        }
\ No newline at end of file
+        }
+
+
+def connection_settings():
+    """
+    Keep connections open between requests (DB_CONN_MAX_AGE seconds, 0 closes
+    them after each request) and check them before reuse.
+    """
+    return {
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS', 'true').lower() == 'true',
+    }
+
+
+def sqlite_pragmas():
+    """
+    WAL lets readers run alongside the writer, and with synchronous=NORMAL
+    a commit no longer waits for an fsync (the last commits can be lost on
+    power failure, never corrupted). busy_timeout makes a connection wait
+    for the write lock instead of failing with 'database is locked', and
+    mmap_size serves reads from the page cache without copying.
+    """
+    return {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    }
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """connection_created receiver applying the database's PRAGMAS"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
\ No newline at end of file
@@ -2,6 +2,7 @@
 Django settings for AI Comparator project.
 """
 
+import json
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +63,12 @@ CORS_ALLOW_HEADERS = [
     'authorization',
 ]
 
+CORS_EXPOSE_HEADERS = [
+    'x-cache',
+    'server-timing',
+    'retry-after',
+]
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -78,6 +86,13 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Serve the AI endpoints with async views (set by config/asgi.py)
+AI_ASYNC_VIEWS = os.getenv('AI_ASYNC_VIEWS', 'false').lower() == 'true'
+# Load provider SDKs and clients when a worker starts instead of on its first
+# request (see api/warmup.py; not with gunicorn --preload)
+AI_WARMUP = os.getenv('AI_WARMUP', 'false').lower() == 'true'
 
 # Database configuration is handled by database_config.py
 # Use DB_TYPE=postgresql or DB_TYPE=sqlite in .env to switch
@@ -101,6 +116,106 @@ AUTH_USER_MODEL = 'api.User'
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
+# Max number of provider calls running at once in this process
+AI_MAX_WORKERS = int(os.getenv('AI_MAX_WORKERS', '16'))
+
+# Provider HTTP connection pools (clients are shared by all threads of a worker);
+# the default size of each provider's pool, see `max_connections` in AI_PROVIDERS
+PROVIDER_MAX_CONNECTIONS = int(os.getenv('PROVIDER_MAX_CONNECTIONS', str(AI_MAX_WORKERS)))
+PROVIDER_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('PROVIDER_MAX_KEEPALIVE_CONNECTIONS', str(AI_MAX_WORKERS)))
+PROVIDER_KEEPALIVE_EXPIRY = float(os.getenv('PROVIDER_KEEPALIVE_EXPIRY', '60'))
+# 'grpc' (default, one multiplexed channel) or 'rest'
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT') or None
+
+# Override provider endpoints, e.g. to point at bench/fake_providers.py
+GROQ_BASE_URL = os.getenv('GROQ_BASE_URL') or None
+GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL') or None
+
+# Providers that can be compared. `kind` picks the client: 'groq', 'gemini'
+# or 'openai' (any OpenAI-compatible server; needs `base_url`, and reads its
+# key from the env var named by `api_key_env`, if any). Optional limits:
+# `max_tokens`, `timeout` (seconds per call) and `max_in_flight` (cap of the
+# provider's adaptive concurrency limit). AI_PROVIDERS adds or overrides
+# entries with a JSON object, e.g.
+#   {"groq-8b": {"kind": "groq", "model": "llama-3.1-8b-instant", "label": "Groq Llama 3.1 8B"},
+#    "local": {"kind": "openai", "model": "qwen2.5", "base_url": "http://localhost:11434/v1"}}
+AI_PROVIDERS = {
+    'groq': {'kind': 'groq', 'model': 'llama-3.3-70b-versatile', 'label': 'Groq', 'max_tokens': 1000},
+    'gemini': {'kind': 'gemini', 'model': 'gemini-flash-latest', 'label': 'Gemini'},
+}
+for _name, _entry in json.loads(os.getenv('AI_PROVIDERS') or '{}').items():
+    AI_PROVIDERS[_name] = {**AI_PROVIDERS.get(_name, {}), **_entry}
+# providers a compare request uses when it doesn't list them in "providers"
+AI_DEFAULT_PROVIDERS = [name for name in os.getenv('AI_DEFAULT_PROVIDERS', 'groq,gemini').split(',') if name]
+
+# Batch comparisons: max prompts per request, and concurrent calls per provider
+AI_BATCH_MAX_PROMPTS = int(os.getenv('AI_BATCH_MAX_PROMPTS', '500'))
+AI_BATCH_CONCURRENCY = {
+    'groq': int(os.getenv('AI_BATCH_GROQ_CONCURRENCY', '4')),
+    'gemini': int(os.getenv('AI_BATCH_GEMINI_CONCURRENCY', '4')),
+    'rubric': int(os.getenv('AI_BATCH_RUBRIC_CONCURRENCY', '2')),
+}
+
+# Time budget of one AI request in seconds (clients may ask for less with
+# `deadline_ms`), and how it is split: the share of it provider calls may
+# use when a rubric follows, and the share of the rubric stage given to the
+# first judge before falling back to the other one
+AI_REQUEST_DEADLINE = float(os.getenv('AI_REQUEST_DEADLINE', '60'))
+AI_DEADLINE_BUDGETS = {
+    'providers': float(os.getenv('AI_PROVIDER_BUDGET', '0.6')),
+    'judge': float(os.getenv('AI_JUDGE_BUDGET', '0.7')),
+}
+
+# Hedged provider calls: send a duplicate once a call has run longer than
+# this percentile of the provider's last AI_HEDGE_WINDOW latencies
+AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', 'true').lower() == 'true'
+AI_HEDGE_PERCENTILE = float(os.getenv('AI_HEDGE_PERCENTILE', '0.95'))
+AI_HEDGE_WINDOW = int(os.getenv('AI_HEDGE_WINDOW', '200'))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', '20'))
+AI_HEDGE_MIN_DELAY = float(os.getenv('AI_HEDGE_MIN_DELAY', '0.2'))
+
+# Rubric tier when a request doesn't pick one with `"mode"`: 'llm' (judge
+# model), 'fast' (local heuristic scores only) or 'auto' (heuristics first,
+# judge only when neither response leads by AI_FAST_RUBRIC_MARGIN of 50 points)
+AI_RUBRIC_MODE = os.getenv('AI_RUBRIC_MODE', 'llm')
+AI_FAST_RUBRIC_MARGIN = int(os.getenv('AI_FAST_RUBRIC_MARGIN', '10'))
+
+# Per-provider circuit breaker: open after this many failures in a row and
+# let probe calls through again after the reset timeout (seconds)
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('AI_BREAKER_FAILURE_THRESHOLD', '5'))
+AI_BREAKER_RESET_TIMEOUT = float(os.getenv('AI_BREAKER_RESET_TIMEOUT', '30'))
+AI_BREAKER_HALF_OPEN_CALLS = int(os.getenv('AI_BREAKER_HALF_OPEN_CALLS', '1'))
+
+# Adaptive (AIMD) limit on calls in flight per provider and process; it is
+# cut on 429s and on calls slower than AI_LIMIT_LATENCY_TOLERANCE times the
+# provider's average latency
+AI_LIMIT_INITIAL = int(os.getenv('AI_LIMIT_INITIAL', str(AI_MAX_WORKERS)))
+AI_LIMIT_MIN = int(os.getenv('AI_LIMIT_MIN', '1'))
+AI_LIMIT_MAX = int(os.getenv('AI_LIMIT_MAX', str(AI_MAX_WORKERS * 4)))
+AI_LIMIT_LATENCY_TOLERANCE = float(os.getenv('AI_LIMIT_LATENCY_TOLERANCE', '2.0'))
+# seconds a call over the limit waits for a slot (never past its own
+# deadline) before it is refused
+AI_LIMIT_QUEUE_TIMEOUT = float(os.getenv('AI_LIMIT_QUEUE_TIMEOUT', '5'))
+
+# Response cache for provider calls: in-process LRU, plus an optional shared
+# Django cache alias (e.g. 'shared', after `manage.py createcachetable`)
+AI_CACHE_ENABLED = os.getenv('AI_CACHE_ENABLED', 'true').lower() == 'true'
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '3600'))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '1000'))
+AI_CACHE_ALIAS = os.getenv('AI_CACHE_ALIAS', '')
+# bump to invalidate cached answers, e.g. when a '-latest' model alias moves
+AI_CACHE_VERSION = os.getenv('AI_CACHE_VERSION', '1')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'ai_cache',
+    },
+}
+
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -120,3 +235,50 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Per-caller limits on the AI endpoints (see api/ratelimit.py), keyed on the
+# user, or on the client IP for anonymous requests. 'compare' covers plain
+# provider calls and 'rubric' requests that also run the judge: a token
+# bucket refilling at `per_minute` up to `burst` requests, and a `daily`
+# quota of prompts (UTC days). 0 turns a limit off.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMITS = {
+    'compare': {
+        'per_minute': float(os.getenv('RATE_LIMIT_COMPARE_PER_MINUTE', '20')),
+        'burst': int(os.getenv('RATE_LIMIT_COMPARE_BURST', '10')),
+        'daily': int(os.getenv('RATE_LIMIT_COMPARE_DAILY', '500')),
+    },
+    'rubric': {
+        'per_minute': float(os.getenv('RATE_LIMIT_RUBRIC_PER_MINUTE', '6')),
+        'burst': int(os.getenv('RATE_LIMIT_RUBRIC_BURST', '3')),
+        'daily': int(os.getenv('RATE_LIMIT_RUBRIC_DAILY', '100')),
+    },
+}
+# Django cache alias holding the counters for all workers (e.g. 'shared');
+# empty keeps them per process
+RATE_LIMIT_CACHE_ALIAS = os.getenv('RATE_LIMIT_CACHE_ALIAS', '')
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+# take the client IP from X-Forwarded-For; only behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv('RATE_LIMIT_TRUST_FORWARDED_FOR', 'false').lower() == 'true'
+
+# How long a user's active flag and token version are trusted before the
+# next auth check reads them again (revocation delay in other processes)
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '10000'))
+
+# Query history pages: default and maximum `limit`
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '5'))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '100'))
+
+# History rows read per query by the export endpoint
+HISTORY_EXPORT_CHUNK_SIZE = int(os.getenv('HISTORY_EXPORT_CHUNK_SIZE', '1000'))
+
+# zlib level (1-9) for stored responses
+HISTORY_COMPRESSION_LEVEL = int(os.getenv('HISTORY_COMPRESSION_LEVEL', '6'))
+
+# Write-behind history inserts (see api/history.py); 'false' writes inline
+HISTORY_WRITE_BEHIND = os.getenv('HISTORY_WRITE_BEHIND', 'true').lower() == 'true'
+HISTORY_FLUSH_SIZE = int(os.getenv('HISTORY_FLUSH_SIZE', '100'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '0.5'))
+# rows buffered before save_history falls back to inserting inline
+HISTORY_MAX_PENDING = int(os.getenv('HISTORY_MAX_PENDING', '10000'))
+
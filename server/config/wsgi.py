@@ -10,3 +10,9 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
 
+from django.conf import settings  # noqa: E402
+
+if settings.AI_WARMUP:
+    from api.warmup import warm_up
+    warm_up()
+